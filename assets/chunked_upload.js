@@ -0,0 +1,112 @@
+// Chunked, resumable upload for the dataset drop zone (see chunked_upload.py).
+// The file is sent in chunks to /upload/chunk/<id>, the Dash app only gets the upload id.
+(function () {
+    var CHUNK_SIZE = 8 * 1024 * 1024; // 8MB per request
+    var MAX_RETRIES = 5;
+
+    function setStatus(text) {
+        var el = document.getElementById('upload-progress');
+        if (el) { el.textContent = text; }
+    }
+
+    function resumeKey(file) {
+        return 'openml-upload:' + file.name + ':' + file.size + ':' + file.lastModified;
+    }
+
+    function sleep(ms) {
+        return new Promise(function (resolve) { setTimeout(resolve, ms); });
+    }
+
+    async function startOrResume(file) {
+        // Resume a previous upload of the same file if the server still has it
+        var previous = window.localStorage.getItem(resumeKey(file));
+        if (previous) {
+            var res = await fetch('/upload/status/' + previous);
+            if (res.ok) {
+                var status = await res.json();
+                return {id: previous, offset: status.offset};
+            }
+        }
+        var start = await fetch('/upload/start', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({filename: file.name, size: file.size})
+        });
+        var body = await start.json();
+        if (!start.ok) { throw new Error(body.error || 'Upload could not be started'); }
+        window.localStorage.setItem(resumeKey(file), body.upload_id);
+        return {id: body.upload_id, offset: body.offset};
+    }
+
+    async function uploadFile(file) {
+        var upload = await startOrResume(file);
+        var offset = upload.offset;
+        var retries = 0;
+        while (offset < file.size) {
+            var chunk = file.slice(offset, Math.min(offset + CHUNK_SIZE, file.size));
+            try {
+                var res = await fetch('/upload/chunk/' + upload.id, {
+                    method: 'PUT',
+                    headers: {'X-Upload-Offset': String(offset), 'Content-Type': 'application/octet-stream'},
+                    body: chunk
+                });
+                var body = await res.json();
+                if (res.ok || res.status === 409) {
+                    // On 409 the server tells us where to continue
+                    offset = body.offset;
+                    retries = 0;
+                } else {
+                    throw new Error(body.error || ('HTTP ' + res.status));
+                }
+            } catch (err) {
+                retries += 1;
+                if (retries > MAX_RETRIES) { throw err; }
+                setStatus('Connection problem, retrying (' + retries + '/' + MAX_RETRIES + ')...');
+                await sleep(1000 * retries);
+                continue;
+            }
+            setStatus('Uploading ' + file.name + ': ' + Math.floor(100 * offset / Math.max(file.size, 1)) + '%');
+        }
+        window.localStorage.removeItem(resumeKey(file));
+        setStatus('Processing ' + file.name + '...');
+        window.dash_clientside.set_props('spool-upload', {data: {upload_id: upload.id, filename: file.name, size: file.size}});
+    }
+
+    function handleFiles(files) {
+        if (!files || files.length === 0) { return; }
+        uploadFile(files[0]).catch(function (err) { setStatus('Upload failed: ' + err.message); });
+    }
+
+    // Hidden file picker, created once outside the Dash layout so status messages can't remove it
+    function filePicker() {
+        var input = document.getElementById('upload-data-input');
+        if (!input) {
+            input = document.createElement('input');
+            input.type = 'file';
+            input.id = 'upload-data-input';
+            input.style.display = 'none';
+            input.addEventListener('change', function () {
+                handleFiles(input.files);
+                input.value = '';
+            });
+            document.body.appendChild(input);
+        }
+        return input;
+    }
+
+    // The layout is rendered by Dash after this script runs, so events are delegated on the document
+    document.addEventListener('click', function (e) {
+        if (e.target.closest && e.target.closest('#upload-data')) {
+            filePicker().click();
+        }
+    });
+    document.addEventListener('dragover', function (e) {
+        if (e.target.closest && e.target.closest('#upload-data')) { e.preventDefault(); }
+    });
+    document.addEventListener('drop', function (e) {
+        if (e.target.closest && e.target.closest('#upload-data')) {
+            e.preventDefault();
+            handleFiles(e.dataTransfer.files);
+        }
+    });
+})();
@@ -0,0 +1,221 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import yaml
+from langdetect import detect
+from ingest import read_dataset, optimize_dtypes
+from profiling import profile_dataset
+from feature_detection import return_predictions_of_features
+from validation import validate_publish, error_message
+from functions import publish, published_url, chat_api, build_attributes, language_names
+from duplicate_index import INDEX_ENABLED as DUPLICATE_INDEX_ENABLED, dataset_signature, find_duplicates, record_dataset, duplicate_message
+from prompts import build_prompts, description_prompt
+
+
+###################################
+## Batch upload without the web interface
+# Runs the same pipeline as the upload page (ingest -> feature types -> validation -> description -> publish)
+# for every dataset of a manifest. Datasets run in parallel in a process pool, every finished
+# dataset is appended to a checkpoint file, so an interrupted batch continues where it stopped.
+# Usage:
+#   python batch_upload.py datasets/ manifest.yaml --api-key KEY --workers 4 --report report.csv
+#
+# The manifest is a CSV file or a YAML list with one entry per dataset. Only 'file' is required:
+#   file, name, description, license, creator, contributor, collection_date (YYYY-MM-DD),
+#   language, citation, target, ignore, row_id, sheet (of an Excel file, default the first one)
+# Without a description one is generated, without a language it is detected.
+# Datasets that have been published before (duplicate_index.py) are skipped with the status
+# 'duplicate', unless --allow-duplicates is given.
+
+DEFAULT_LICENSE = "Public Domain (CC0)"
+REPORT_FIELDS = ['file', 'name', 'status', 'rows', 'columns', 'ingest', 'features', 'description', 'publish', 'total', 'message']
+
+
+def read_manifest(path):
+    if path.endswith(('.yaml', '.yml')):
+        with open(path) as f:
+            entries = yaml.safe_load(f) or []
+        if isinstance(entries, dict):
+            entries = entries.get('datasets', [])
+    else:
+        with open(path, newline='') as f:
+            entries = list(csv.DictReader(f))
+
+    manifest = []
+    for nr, entry in enumerate(entries):
+        # Empty cells are the same as missing ones
+        entry = {key.strip(): (str(value).strip() if value is not None else None) for key, value in entry.items() if key}
+        entry = {key: value for key, value in entry.items() if value not in (None, '', 'None')}
+        if 'file' not in entry:
+            raise ValueError(f"Entry {nr + 1} of {path} has no 'file'")
+        manifest.append(entry)
+    return manifest
+
+
+def _metadata(entry, description):
+    # Same clean up of the name and the description as the upload page
+    name = entry.get('name', os.path.splitext(os.path.basename(entry['file']))[0]).replace(' ', '_')
+    desc = description
+    for old, new in (('“', '"'), ('”', '"'), ('‘', "'"), ('’', "'"), ('—', '-'), ('–', '-'), ('…', '...')):
+        desc = desc.replace(old, new)
+    date = datetime.strptime(entry['collection_date'], '%Y-%m-%d') if 'collection_date' in entry else datetime.now()
+
+    ignore = entry.get('ignore')
+    if ignore is not None and ',' in ignore:
+        ignore = [col.strip() for col in ignore.split(',')]
+    return dict(name=name, description=desc, license=entry.get('license', DEFAULT_LICENSE),
+                creator=entry.get('creator', ''), contributor=entry.get('contributor', ''),
+                collection_date=date.strftime('%d-%m-%Y'), language=entry.get('language'),
+                default_target_attribute=entry.get('target'), ignore_attribute=ignore,
+                citation=entry.get('citation', ''), row_id=entry.get('row_id'))
+
+
+def upload_dataset(entry, directory, api, dry_run=False, allow_duplicates=False):
+    # Runs in a worker process. Returns one row of the report, errors don't stop the batch.
+    timings = {}
+    result = {'file': entry['file'], 'name': entry.get('name'), 'status': 'failed', 'message': ''}
+    start = time.perf_counter()
+    stage = 'ingest'
+    try:
+        path = os.path.join(directory, entry['file'])
+        df, declared_types = read_dataset(path, sheet=entry.get('sheet') or None)
+        df, _ = optimize_dtypes(df)
+        profile = profile_dataset(df)
+        result.update(rows=len(df), columns=len(df.columns))
+        signature = None
+        if DUPLICATE_INDEX_ENABLED:
+            signature = dataset_signature(df, profile)
+            duplicates = find_duplicates(signature)
+            if duplicates and not allow_duplicates:
+                result.update(status='duplicate', message=f"Already published: {duplicate_message(duplicates)}")
+                timings['ingest'] = time.perf_counter() - start
+                return result
+        timings['ingest'] = time.perf_counter() - start
+
+        stage = 'features'
+        infer_exp = return_predictions_of_features(df, known_types=declared_types, profile=profile)[0]
+        features = [{'FeatureName': col, 'FeatureTypePublish': str(col_type)} for col, col_type in zip(df.columns, infer_exp)]
+        attributes, _ = build_attributes(df, features, profile=profile)
+
+        # Before the description is generated, a dataset that OpenML would reject costs nothing more
+        stage = 'validate'
+        errors = validate_publish(df, attributes, entry.get('target'), entry.get('ignore'), entry.get('row_id'), profile=profile)
+        if errors:
+            raise ValueError(error_message(errors))
+        timings['features'] = time.perf_counter() - start - sum(timings.values())
+
+        stage = 'description'
+        prompts = build_prompts(entry['file'], profile)
+        description = entry.get('description') or chat_api(description_prompt(entry['file'], prompts)[0])
+        if 'language' not in entry:
+            entry = dict(entry, language=language_names.get(detect(prompts[0]), 'English'))
+        metadata = _metadata(entry, description)
+        result['name'] = metadata['name']
+        timings['description'] = time.perf_counter() - start - sum(timings.values())
+
+        stage = 'publish'
+        if dry_run:
+            result.update(status='checked', message="Dry run, not published")
+        else:
+            message = publish(data=df, attributes=attributes, api=api, **metadata)
+            result.update(status='failed' if message.startswith('An error occurred') else 'done', message=message)
+            if signature is not None and published_url(message):
+                record_dataset(signature, published_url(message), metadata['name'])
+        timings['publish'] = time.perf_counter() - start - sum(timings.values())
+    except Exception as e:
+        result['message'] = f"{stage} failed: {e}"
+    finally:
+        result.update({key: round(value, 3) for key, value in timings.items()})
+        result['total'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+###################################
+## Checkpoint and report
+
+def read_checkpoint(path):
+    # {file: report row} of the datasets that were uploaded in an earlier run.
+    # Failed and dry run datasets are run again.
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue # line of an interrupted write
+                if row.get('status') == 'done':
+                    done[row['file']] = row
+    return done
+
+
+def append_checkpoint(path, row):
+    with open(path, 'a') as f:
+        f.write(json.dumps(row) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_report(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_batch(directory, manifest, api, workers=2, checkpoint=None, report=None, dry_run=False, allow_duplicates=False):
+    entries = read_manifest(manifest)
+    checkpoint = checkpoint or manifest + '.checkpoint.jsonl'
+    done = read_checkpoint(checkpoint)
+    rows = [done[entry['file']] for entry in entries if entry['file'] in done]
+    todo = [entry for entry in entries if entry['file'] not in done]
+    print(f"{len(entries)} datasets, {len(rows)} already uploaded, {len(todo)} to go", file=sys.stderr)
+
+    # At most `workers` datasets are in flight, a dataset is only read when a worker is free
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        todo = iter(todo)
+        while True:
+            for entry in todo:
+                pending.add(pool.submit(upload_dataset, entry, directory, api, dry_run, allow_duplicates))
+                if len(pending) >= workers:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                row = future.result()
+                append_checkpoint(checkpoint, row)
+                rows.append(row)
+                print(f"[{row['status']}] {row['file']} ({row['total']}s) {row['message']}", file=sys.stderr)
+
+    if report:
+        write_report(report, rows)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Upload every dataset of a manifest to OpenML')
+    parser.add_argument('directory', help='directory with the dataset files')
+    parser.add_argument('manifest', help='CSV or YAML file with one entry per dataset')
+    parser.add_argument('--api-key', default=os.environ.get('OPENML_API_KEY'), help='OpenML API key (default: $OPENML_API_KEY)')
+    parser.add_argument('--workers', type=int, default=2, help='datasets processed at the same time')
+    parser.add_argument('--checkpoint', help='progress file (default: <manifest>.checkpoint.jsonl)')
+    parser.add_argument('--report', default='batch_report.csv', help='CSV file with the timings per dataset')
+    parser.add_argument('--dry-run', action='store_true', help='run everything except the publish')
+    parser.add_argument('--allow-duplicates', action='store_true', help='also publish datasets that have been published before')
+    args = parser.parse_args()
+    if not args.api_key and not args.dry_run:
+        parser.error('an OpenML API key is needed, use --api-key or OPENML_API_KEY')
+
+    rows = run_batch(args.directory, args.manifest, args.api_key, args.workers, args.checkpoint, args.report, args.dry_run, args.allow_duplicates)
+    failed = [row for row in rows if row['status'] == 'failed']
+    duplicates = [row for row in rows if row['status'] == 'duplicate']
+    print(f"{len(rows) - len(failed) - len(duplicates)} {'checked' if args.dry_run else 'uploaded'}, {len(duplicates)} already published, "
+          f"{len(failed)} failed, report in {args.report}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
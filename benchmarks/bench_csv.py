@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import read_csv, sniff_csv
+
+
+###################################
+## Benchmark of the CSV ingest engines
+# Compares the pyarrow reader with the pandas C parser on the given files, or on a generated
+# file that looks like our typical uploads (numbers, categories, free text and dates).
+# Usage: python benchmarks/bench_csv.py --rows 1000000
+#        python benchmarks/bench_csv.py data/a.csv data/b.csv
+
+def generate_csv(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        'id': np.arange(rows),
+        'value': rng.normal(size=rows),
+        'count': rng.integers(0, 1000, rows),
+        'city': rng.choice(['Amsterdam', 'Eindhoven', 'Utrecht', 'Delft', 'Leiden'], rows),
+        'comment': rng.choice(['good product', 'would not buy again', 'ok', 'fast delivery, nice'], rows),
+        'date': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1500, rows), unit='D'),
+    }).to_csv(path, index=False)
+
+
+def bench_file(path, repeat):
+    result = {'file': path, 'bytes': os.path.getsize(path)}
+    start = time.perf_counter()
+    result['dialect'] = sniff_csv(path)
+    result['sniff_s'] = time.perf_counter() - start
+    for engine in ('pyarrow', 'pandas'):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            df = read_csv(path, engine=engine)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        result[engine] = {'best_s': best, 'rows': len(df), 'rows_per_s': len(df) / best,
+                          'memory_bytes': int(df.memory_usage(deep=True).sum())}
+    result['speedup'] = result['pandas']['best_s'] / result['pyarrow']['best_s']
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--rows', type=int, default=500000, help='rows of the generated file when no files are given')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    files = args.files
+    if not files:
+        path = os.path.join(tempfile.mkdtemp(), 'generated.csv')
+        generate_csv(path, args.rows)
+        files = [path]
+    print(json.dumps([bench_file(path, args.repeat) for path in files], indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_openai_server import create_app
+
+
+###################################
+## Benchmark of the description generation against the local OpenAI stand-in
+# Compares the time until the user sees the first text (time to first token) for the
+# blocking chat_api call and the streamed stream_chat_api call.
+# Usage: python benchmarks/bench_description.py --runs 5 --token-delay 0.01
+
+def start_server(latency, token_delay, words):
+    server = make_server('127.0.0.1', 0, create_app(latency=latency, token_delay=token_delay, words=words), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--token-delay', type=float, default=0.01)
+    parser.add_argument('--words', type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_server(args.latency, args.token_delay, args.words)
+    os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{server.server_port}/v1'
+    os.environ.setdefault('OPENAI_API_KEY', 'offline')
+    from functions import chat_api, stream_chat_api
+
+    prompt = "Dataset name: bench.csv, Columns : a: [1, 2, 3, 4, 5], b: ['x', 'y', 'z', 'x', 'y']"
+    results = {'blocking': [], 'streaming': []}
+    # The description cache would answer every run after the first one, so it is not used
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        chat_api(prompt, use_cache=False)
+        total = time.perf_counter() - start
+        results['blocking'].append({'first_token_s': total, 'total_s': total})
+
+        start = time.perf_counter()
+        first = None
+        for _token in stream_chat_api(prompt, use_cache=False):
+            if first is None:
+                first = time.perf_counter() - start
+        results['streaming'].append({'first_token_s': first, 'total_s': time.perf_counter() - start})
+
+    server.shutdown()
+    summary = {mode: {key: sum(run[key] for run in runs) / len(runs) for key in ('first_token_s', 'total_s')}
+               for mode, runs in results.items()}
+    print(json.dumps({'runs': results, 'mean': summary}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_DIR = tempfile.mkdtemp()
+os.environ['DATASET_STORE_DIR'] = STORE_DIR
+sys.path.insert(0, ROOT)
+from dataset_store import save_dataset
+
+
+###################################
+## Load test of the production server
+# Starts serve.py with 1, 2, 4, ... workers and sends concurrent "Generate Feature Types"
+# callbacks (sortinghat inference without cache, CPU bound) for a stored dataset. Reports the
+# throughput and latency per worker count; on a machine with enough cores the throughput
+# grows with the number of workers.
+# Usage: python benchmarks/bench_load.py --workers 1 2 4 --requests 40 --concurrency 8
+
+def make_dataset(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'value': rng.normal(size=rows),
+        'city': rng.choice(['Amsterdam', 'Eindhoven', 'Utrecht', 'Delft'], rows),
+        'comment': rng.choice(['good product', 'would not buy again', 'fast delivery, nice'], rows),
+    })
+
+
+def features_request(token):
+    # Body of the Dash callback request that the "Generate Feature Types" button sends
+    return json.dumps({
+        'output': 'feature-grid.rowData',
+        'outputs': {'id': 'feature-grid', 'property': 'rowData'},
+        'inputs': [{'id': 'features_btn', 'property': 'n_clicks', 'value': 1}],
+        'changedPropIds': ['features_btn.n_clicks'],
+        'state': [{'id': 'stored-dataframe', 'property': 'data', 'value': token}],
+    }).encode('utf-8')
+
+
+def start_server(workers, port, timeout=180):
+    env = dict(os.environ, FEATURE_CACHE_ENABLED='0', FEATURE_INFERENCE_WORKERS='1', METRICS_ENABLED='0')
+    process = subprocess.Popen([sys.executable, 'serve.py', '--workers', str(workers), '--bind', f'127.0.0.1:{port}'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise TimeoutError(f'serve.py did not answer within {timeout} seconds')
+
+
+def send(url, body):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=300) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run_load(port, body, requests, concurrency):
+    url = f'http://127.0.0.1:{port}/_dash-update-component'
+    send(url, body) # every worker loads the dataset once, not measured
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(lambda _: send(url, body), range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {'requests': requests, 'seconds': elapsed, 'throughput_per_s': requests / elapsed,
+            'latency_p50_s': statistics.median(latencies), 'latency_p95_s': latencies[int(0.95 * (len(latencies) - 1))]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--port', type=int, default=8062)
+    args = parser.parse_args()
+
+    body = features_request(save_dataset(make_dataset(args.rows)))
+    results = []
+    for workers in args.workers:
+        process = start_server(workers, args.port)
+        try:
+            results.append(dict(workers=workers, **run_load(args.port, body, args.requests, args.concurrency)))
+        finally:
+            process.terminate()
+            process.wait()
+    base = results[0]['throughput_per_s']
+    for result in results:
+        result['scaling'] = result['throughput_per_s'] / base
+    print(json.dumps({'cpus': os.cpu_count(), 'rows': args.rows, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+import arff
+
+# Caches would hide the work that is measured, every run starts empty
+os.environ['FEATURE_CACHE_ENABLED'] = '0'
+os.environ.setdefault('DATASET_STORE_DIR', tempfile.mkdtemp())
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from langdetect import detect
+import openml as oml
+from ingest import read_dataset, sniff_csv, excel_sheets, optimize_dtypes
+from profiling import profile_dataset
+from feature_detection import return_predictions_of_features
+from dataset_store import save_dataset, load_dataset, delete_dataset
+from functions import build_attributes, arff_compatible
+from streaming_publish import OpenMLAdapter, dataframe_chunks, write_arff
+from prompts import build_prompts
+
+
+###################################
+## Benchmark of every stage of an upload
+# Generates datasets of the given shapes and type mixes and measures wall time and peak Python
+# memory (tracemalloc) of every stage from parsing to the ARFF serialization of create_dataset
+# and the chunked ARFF file that functions.publish writes instead (write_arff).
+# The base64 decode of the old upload is gone (files are spooled in chunks), the JSON store
+# round-trip is the Parquet dataset store now and the column sampling is part of the profile.
+# The parse stages report their throughput in rows per second (rows_per_s).
+# The result is JSON. With --baseline the stages are compared to an earlier result and the
+# script exits with 1 when a stage got slower than the tolerance.
+# Usage: python benchmarks/bench_pipeline.py --rows 10000 100000 --columns 10 --output result.json
+#        python benchmarks/bench_pipeline.py --baseline benchmarks/baseline.json --tolerance 0.25
+
+COLUMN_TYPES = ('numeric', 'categorical', 'text', 'dates', 'urls')
+MIXES = {
+    'mixed': COLUMN_TYPES,
+    'numeric': ('numeric',),
+    'categorical': ('categorical',),
+    'text': ('text', 'urls'),
+}
+WORDS = ['data', 'model', 'open', 'machine', 'learning', 'value', 'sample', 'river', 'city', 'price']
+
+
+def generate_column(kind, rows, rng):
+    if kind == 'numeric':
+        return rng.normal(size=rows).round(4)
+    if kind == 'categorical':
+        return rng.choice(['red', 'green', 'blue', 'yellow', 'black'], rows)
+    if kind == 'text':
+        words = rng.choice(WORDS, (rows, 6))
+        return [' '.join(row) for row in words]
+    if kind == 'dates':
+        return (pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1500, rows), unit='D')).strftime('%Y-%m-%d')
+    if kind == 'urls':
+        return [f'https://example.org/{word}/{nr}' for word, nr in zip(rng.choice(WORDS, rows), rng.integers(0, 10000, rows))]
+    raise ValueError(kind)
+
+
+def generate_dataset(rows, columns, mix, seed=0):
+    rng = np.random.default_rng(seed)
+    kinds = MIXES[mix]
+    return pd.DataFrame({f'{kinds[nr % len(kinds)]}_{nr}': generate_column(kinds[nr % len(kinds)], rows, rng)
+                         for nr in range(columns)})
+
+
+def write_file(df, path, fmt):
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+    elif fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    elif fmt == 'json':
+        df.to_json(path, orient='records')
+    elif fmt == 'ndjson':
+        df.to_json(path, orient='records', lines=True)
+    elif fmt == 'xlsx':
+        df.to_excel(path, index=False)
+    elif fmt == 'arff':
+        attributes = [(col, 'REAL' if pd.api.types.is_numeric_dtype(df[col]) else 'STRING') for col in df.columns]
+        with open(path, 'w') as f:
+            arff.dump({'relation': 'bench', 'attributes': attributes, 'data': df.values.tolist()}, f)
+    else:
+        raise ValueError(fmt)
+
+
+def measure(stages, name, fn, memory=True, payload=None):
+    # Wall time of fn, then peak memory allocated through Python (NumPy included, Arrow buffers
+    # are not) in a second run, tracemalloc would distort the time
+    start = time.perf_counter()
+    result = fn()
+    stages[name] = {'time_s': time.perf_counter() - start}
+    if memory:
+        tracemalloc.start()
+        fn()
+        stages[name]['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if payload is not None:
+        stages[name]['payload_bytes'] = payload
+    return result
+
+
+def store_roundtrip(df, profile):
+    token = save_dataset(df, metadata={'profile': profile})
+    stored = load_dataset(token)
+    delete_dataset(token)
+    return stored
+
+
+def create_arff(df, attributes):
+    return oml.datasets.functions.create_dataset(
+        name='bench', description='Benchmark dataset', creator='bench', contributor='bench',
+        collection_date='01-01-2024', language='English', licence='Public Domain (CC0)',
+        default_target_attribute=None, row_id_attribute=None, ignore_attribute=None, citation='',
+        attributes=attributes, data=arff_compatible(df))
+
+
+def write_streaming(df, attributes, path):
+    # The serialization of functions.publish: header from the first row, rows in chunks to a file
+    header = OpenMLAdapter(oml).arff_header(create_arff(df.iloc[:1], attributes))
+    return write_arff(path, header, attributes, (arff_compatible(chunk) for chunk in dataframe_chunks(df)))
+
+
+def bench_shape(rows, columns, mix, formats, workdir, memory=True):
+    df = generate_dataset(rows, columns, mix)
+    stages = {}
+    parsed = None
+    for fmt in formats:
+        path = os.path.join(workdir, f'bench_{rows}_{columns}_{mix}.{fmt}')
+        write_file(df, path, fmt)
+        if fmt == 'csv':
+            measure(stages, 'sniff_csv', lambda: sniff_csv(path), memory)
+        if fmt == 'xlsx':
+            measure(stages, 'excel_sheets', lambda: excel_sheets(path), memory)
+        parsed_fmt, _ = measure(stages, f'parse_{fmt}', lambda: read_dataset(path), memory, os.path.getsize(path))
+        stages[f'parse_{fmt}']['rows_per_s'] = rows / stages[f'parse_{fmt}']['time_s']
+        parsed = parsed if parsed is not None else parsed_fmt
+        os.remove(path)
+
+    parsed, _ = measure(stages, 'optimize_dtypes', lambda: optimize_dtypes(parsed), memory)
+    profile = measure(stages, 'profile', lambda: profile_dataset(parsed), memory)
+    prompt = measure(stages, 'build_prompts', lambda: build_prompts('bench.csv', profile), memory)[0]
+    measure(stages, 'detect_language', lambda: detect(prompt), memory, len(prompt.encode('utf-8')))
+    infer_exp = measure(stages, 'feature_types', lambda: return_predictions_of_features(parsed, profile=profile)[0], memory)
+    stored = measure(stages, 'store_roundtrip', lambda: store_roundtrip(parsed, profile), memory)
+
+    features = [{'FeatureName': col, 'FeatureTypePublish': str(col_type)} for col, col_type in zip(stored.columns, infer_exp)]
+    attributes, _ = measure(stages, 'build_attributes', lambda: build_attributes(stored, features, profile=profile), memory)
+    dataset = measure(stages, 'create_dataset', lambda: create_arff(stored, attributes), memory)
+    stages['create_dataset']['payload_bytes'] = len(dataset._dataset.encode('utf-8'))
+    path = os.path.join(workdir, 'bench.arff')
+    measure(stages, 'write_arff', lambda: write_streaming(stored, attributes, path), memory, stages['create_dataset']['payload_bytes'])
+    os.remove(path)
+
+    return {'rows': rows, 'columns': columns, 'mix': mix, 'stages': stages,
+            'total_s': sum(stage['time_s'] for stage in stages.values())}
+
+
+def shape_key(result):
+    return f"{result['rows']}x{result['columns']}:{result['mix']}"
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    # Stages that are slower than the baseline by more than the tolerance (and min_seconds)
+    previous = {shape_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(shape_key(result))
+        if old is None:
+            continue
+        for stage, values in result['stages'].items():
+            if stage not in old['stages']:
+                continue
+            before, after = old['stages'][stage]['time_s'], values['time_s']
+            if after > before * (1 + tolerance) and after - before > min_seconds:
+                regressions.append({'shape': shape_key(result), 'stage': stage, 'baseline_s': before,
+                                    'time_s': after, 'ratio': after / before if before else None})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--columns', type=int, nargs='+', default=[10])
+    parser.add_argument('--mix', nargs='+', default=['mixed'], choices=sorted(MIXES))
+    parser.add_argument('--formats', nargs='+', default=['csv', 'arff', 'parquet', 'json'], choices=['csv', 'arff', 'parquet', 'json', 'ndjson', 'xlsx'])
+    parser.add_argument('--no-memory', action='store_true', help='only measure time, halves the run time')
+    parser.add_argument('--output', help='write the result to this file')
+    parser.add_argument('--baseline', help='earlier result to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slow down per stage')
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='slow downs below this are noise')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    # Loads the language profiles and the sortinghat model, so the first shape doesn't pay for it
+    bench_shape(100, len(COLUMN_TYPES), 'mixed', args.formats, workdir, memory=False)
+    results = [bench_shape(rows, columns, mix, args.formats, workdir, not args.no_memory)
+               for rows in args.rows for columns in args.columns for mix in args.mix]
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'created': time.time(), 'results': results}
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_seconds)
+        report['regressions'] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_openml_server import create_app
+
+
+###################################
+## Benchmark of the publish step against the local OpenML stand-in
+# Times serialization and upload of a generated dataset. With --error-rate the server answers
+# some uploads with a database error, which the openml client retries (OPENML_RETRIES).
+# Usage: python benchmarks/bench_publish.py --rows 100000 --runs 3 --error-rate 0.3
+
+def start_server(latency, error_rate):
+    server = make_server('127.0.0.1', 0, create_app(latency=latency, error_rate=error_rate), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_dataset(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'number': rng.integers(0, 1000, rows),
+        'value': rng.random(rows),
+        'category': pd.Categorical(rng.choice(['red', 'green', 'blue'], rows)),
+        'text': [f'row {i}' for i in range(rows)],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--retries', type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_server(args.latency, args.error_rate)
+    os.environ['OPENML_SERVER'] = f'http://127.0.0.1:{server.server_port}/api/v1/xml'
+    os.environ['OPENML_RETRIES'] = str(args.retries)
+    from functions import publish
+
+    df = make_dataset(args.rows)
+    attributes = [('number', 'INTEGER'), ('value', 'REAL'), ('category', ['blue', 'green', 'red']), ('text', 'STRING')]
+    runs = []
+    for nr in range(args.runs):
+        stages = {}
+        start = time.perf_counter()
+        progress = lambda stage, fraction: stages.setdefault(stage, time.perf_counter() - start)
+        message = publish(data=df, name=f'bench_{nr}', description='Benchmark dataset', license='Public Domain (CC0)',
+                          creator='bench', contributor='bench', collection_date='01-01-2024', language='English',
+                          attributes=attributes, default_target_attribute='category', ignore_attribute=None,
+                          citation='', row_id=None, api='offline', progress=progress)
+        total = time.perf_counter() - start
+        runs.append({'ok': message.startswith('URL for dataset'), 'message': message,
+                     'serialize_s': stages.get('upload', total) - stages.get('serialize', 0),
+                     'upload_s': stages.get('server ack', total) - stages.get('upload', total), 'total_s': total})
+
+    server.shutdown()
+    finished = [run for run in runs if run['ok']]
+    summary = {key: sum(run[key] for run in finished) / len(finished) for key in ('serialize_s', 'upload_s', 'total_s')} if finished else {}
+    print(json.dumps({'rows': args.rows, 'runs': runs, 'succeeded': len(finished), 'mean': summary}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
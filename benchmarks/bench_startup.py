@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+###################################
+## Benchmark of the startup time of the app
+# import: seconds to import whole_app, the heavy dependencies are loaded lazily
+# eager: import plus loading every heavy dependency, what the import used to cost
+# first_response: seconds from starting `python whole_app.py` until the page is served
+# Usage: python benchmarks/bench_startup.py --runs 3 --port 8061
+
+IMPORT = "import time; start = time.perf_counter(); import whole_app; print(time.perf_counter() - start)"
+EAGER = ("import time; start = time.perf_counter(); import whole_app; from warmup import warm_up; warm_up(); "
+         "print(time.perf_counter() - start)")
+
+
+def run_python(code):
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def first_response(port, timeout=120):
+    env = dict(os.environ, PORT=str(port))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'whole_app.py'], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError(f'The app did not answer within {timeout} seconds')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8061)
+    args = parser.parse_args()
+
+    results = {'import_s': [], 'eager_s': [], 'first_response_s': []}
+    for _ in range(args.runs):
+        results['import_s'].append(run_python(IMPORT))
+        results['eager_s'].append(run_python(EAGER))
+        results['first_response_s'].append(first_response(args.port))
+    best = {key: min(values) for key, values in results.items()}
+    best['speedup'] = best['eager_s'] / best['import_s']
+    print(json.dumps({'runs': results, 'best': best}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import uuid
+import tempfile
+from flask import request, jsonify
+
+
+###################################
+## Chunked, resumable uploads
+# The browser (assets/chunked_upload.js) sends the file in chunks to a Flask route on the
+# Dash server. Every chunk is streamed straight to a spool file, so memory stays bounded
+# no matter how large the file is. The Dash callbacks only get the upload id of the spool file.
+
+SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'openml_uploader_spool'))
+MAX_UPLOAD_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 20 * 1024 * 1024 * 1024)) # 20GB
+SPOOL_MAX_AGE = int(os.environ.get('UPLOAD_SPOOL_MAX_AGE', 24 * 60 * 60)) # unfinished uploads are removed after a day
+STREAM_BLOCK_SIZE = 1024 * 1024 # bytes read from the request at once
+
+
+def _upload_id(upload_id):
+    # Only ids generated by /upload/start are accepted
+    try:
+        return uuid.UUID(str(upload_id)).hex
+    except ValueError:
+        raise KeyError(f"Invalid upload id: {upload_id}")
+
+
+def _data_path(upload_id):
+    return os.path.join(SPOOL_DIR, _upload_id(upload_id) + '.part')
+
+
+def _meta_path(upload_id):
+    return os.path.join(SPOOL_DIR, _upload_id(upload_id) + '.json')
+
+
+def _read_meta(upload_id):
+    try:
+        with open(_meta_path(upload_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise KeyError(f"Upload {upload_id} does not exist")
+
+
+def _write_meta(upload_id, meta):
+    path = _meta_path(upload_id)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(path + '.tmp', path)
+
+
+def _received(upload_id):
+    try:
+        return os.path.getsize(_data_path(upload_id))
+    except FileNotFoundError:
+        return 0
+
+
+###################################
+## Functions used by the Dash callbacks
+
+def spool_path(upload_id):
+    # Path of a finished upload
+    meta = _read_meta(upload_id)
+    if not meta.get('complete'):
+        raise KeyError(f"Upload {upload_id} is not complete")
+    return _data_path(upload_id)
+
+
+def spool_filename(upload_id):
+    return _read_meta(upload_id)['filename']
+
+
+def delete_spool(upload_id):
+    for path in (_data_path(upload_id), _meta_path(upload_id)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def cleanup_spool(max_age=SPOOL_MAX_AGE):
+    if not os.path.isdir(SPOOL_DIR):
+        return
+    now = time.time()
+    for name in os.listdir(SPOOL_DIR):
+        path = os.path.join(SPOOL_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+###################################
+## Flask routes
+
+def register_upload_routes(server):
+
+    @server.route('/upload/start', methods=['POST'])
+    def upload_start():
+        body = request.get_json(silent=True) or {}
+        filename = os.path.basename(str(body.get('filename', '')))
+        try:
+            size = int(body.get('size'))
+        except (TypeError, ValueError):
+            return jsonify(error='File size is missing'), 400
+        if not filename:
+            return jsonify(error='Filename is missing'), 400
+        if size > MAX_UPLOAD_BYTES:
+            return jsonify(error=f'File is larger than {MAX_UPLOAD_BYTES} bytes'), 413
+
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        cleanup_spool()
+        upload_id = uuid.uuid4().hex
+        open(_data_path(upload_id), 'wb').close()
+        _write_meta(upload_id, {'filename': filename, 'size': size, 'complete': size == 0, 'started': time.time()})
+        return jsonify(upload_id=upload_id, offset=0)
+
+    @server.route('/upload/status/<upload_id>', methods=['GET'])
+    def upload_status(upload_id):
+        # Used by the browser to resume an interrupted upload
+        try:
+            meta = _read_meta(upload_id)
+        except KeyError:
+            return jsonify(error='Unknown upload'), 404
+        return jsonify(upload_id=upload_id, offset=_received(upload_id), size=meta['size'], complete=meta['complete'])
+
+    @server.route('/upload/chunk/<upload_id>', methods=['PUT'])
+    def upload_chunk(upload_id):
+        try:
+            meta = _read_meta(upload_id)
+        except KeyError:
+            return jsonify(error='Unknown upload'), 404
+        try:
+            offset = int(request.headers.get('X-Upload-Offset', -1))
+        except ValueError:
+            offset = -1
+
+        received = _received(upload_id)
+        if offset != received:
+            # Chunk does not continue the spool file, tell the client where to resume
+            return jsonify(error='Offset mismatch', offset=received), 409
+
+        # Stream the body to disk block by block
+        with open(_data_path(upload_id), 'ab') as f:
+            while True:
+                block = request.stream.read(STREAM_BLOCK_SIZE)
+                if not block:
+                    break
+                if received + len(block) > meta['size']:
+                    f.truncate(offset)
+                    return jsonify(error='More data than announced', offset=offset), 400
+                f.write(block)
+                received += len(block)
+
+        if received == meta['size']:
+            meta['complete'] = True
+            _write_meta(upload_id, meta)
+        return jsonify(upload_id=upload_id, offset=received, complete=meta['complete'])
@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import pandas as pd
+import hashlib
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+
+###################################
+## Server-side dataset store
+# Uploaded datasets are written to local disk as Parquet and the browser only gets
+# an opaque token. Every callback loads the typed columns back from disk instead of
+# posting the whole dataset as JSON through dcc.Store.
+# The store lives on the filesystem, so it is shared between all server workers.
+
+STORE_DIR = os.environ.get('DATASET_STORE_DIR', os.path.join(tempfile.gettempdir(), 'openml_uploader_store'))
+MAX_STORE_BYTES = int(os.environ.get('DATASET_STORE_MAX_BYTES', 10 * 1024 * 1024 * 1024)) # 10GB
+MAX_STORE_ENTRIES = int(os.environ.get('DATASET_STORE_MAX_ENTRIES', 100))
+
+ROW_GROUP_ROWS = int(os.environ.get('DATASET_STORE_ROW_GROUP_ROWS', 65536)) # granularity of row range reads
+MAX_SORTED_COPIES = int(os.environ.get('DATASET_STORE_MAX_SORTED_COPIES', 4)) # sorted copies kept per dataset
+
+DATA_FILE = 'data.parquet'
+META_FILE = 'meta.json'
+
+
+def _entry_dir(token):
+    # Tokens are generated by us, anything else is rejected so a client can't point at arbitrary paths
+    try:
+        token = uuid.UUID(str(token)).hex
+    except ValueError:
+        raise KeyError(f"Invalid dataset token: {token}")
+    return os.path.join(STORE_DIR, token)
+
+
+def _arrow_safe(df):
+    # Parquet needs string column names and one type per column.
+    # Object columns with mixed python types are converted to strings, missing values are kept.
+    df = df.copy()
+    df.columns = [str(col) for col in df.columns]
+    for col in df.columns:
+        if df[col].dtype == object:
+            inferred = pd.api.types.infer_dtype(df[col], skipna=True)
+            if inferred.startswith('mixed') or inferred in ('bytes', 'decimal', 'complex'):
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+###################################
+## Public functions
+
+def save_dataset(df, filename=None, metadata=None):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    token = uuid.uuid4().hex
+    entry = _entry_dir(token)
+    tmp_entry = entry + '.tmp'
+    os.makedirs(tmp_entry)
+    try:
+        try:
+            df.to_parquet(os.path.join(tmp_entry, DATA_FILE), index=False, row_group_size=ROW_GROUP_ROWS)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError, TypeError):
+            _arrow_safe(df).to_parquet(os.path.join(tmp_entry, DATA_FILE), index=False, row_group_size=ROW_GROUP_ROWS)
+
+        meta = {'filename': filename, 'n_rows': int(len(df)), 'n_columns': int(len(df.columns)),
+                'created': time.time()}
+        meta.update(metadata or {})
+        with open(os.path.join(tmp_entry, META_FILE), 'w') as f:
+            json.dump(meta, f)
+        # Rename is atomic, so other workers never see a half written entry
+        os.rename(tmp_entry, entry)
+    except Exception:
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        raise
+
+    evict(keep=token)
+    return token
+
+
+def dataset_path(token):
+    path = os.path.join(_entry_dir(token), DATA_FILE)
+    if not os.path.exists(path):
+        raise KeyError(f"Dataset {token} is not in the store (expired or never uploaded)")
+    return path
+
+
+def load_dataset(token, columns=None):
+    path = dataset_path(token)
+    _touch(token)
+    return pd.read_parquet(path, columns=columns)
+
+
+def iter_row_groups(token, columns=None):
+    # The dataset one row group at a time, for writing it out without loading it whole
+    path = dataset_path(token)
+    _touch(token)
+    parquet_file = pq.ParquetFile(path)
+    for group in range(parquet_file.num_row_groups):
+        yield parquet_file.read_row_group(group, columns=columns).to_pandas()
+
+
+def dataset_schema(token):
+    # Column names and number of rows from the Parquet footer, no data is read
+    metadata = pq.read_metadata(dataset_path(token))
+    return metadata.schema.to_arrow_schema().names, metadata.num_rows
+
+
+def read_rows(token, start, stop, columns=None, sort_by=None, ascending=True):
+    # Rows start:stop of the dataset, optionally sorted by one column.
+    # Only the row groups that overlap the window are read from disk.
+    path = _sorted_path(token, sort_by, ascending) if sort_by is not None else dataset_path(token)
+    _touch(token)
+    try:
+        parquet_file = pq.ParquetFile(path)
+    except FileNotFoundError:
+        if sort_by is None:
+            raise
+        # The sorted copy was removed by another worker (MAX_SORTED_COPIES), it is written again
+        parquet_file = pq.ParquetFile(_sorted_path(token, sort_by, ascending))
+    start, stop = max(int(start), 0), min(int(stop), parquet_file.metadata.num_rows)
+
+    tables = []
+    offset = 0
+    for group in range(parquet_file.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(group).num_rows
+        if offset >= stop:
+            break
+        if offset + group_rows > start:
+            table = parquet_file.read_row_group(group, columns=columns)
+            first = max(start - offset, 0)
+            tables.append(table.slice(first, min(stop - offset, group_rows) - first))
+        offset += group_rows
+
+    if not tables:
+        schema = parquet_file.schema_arrow
+        tables = [schema.empty_table() if columns is None else schema.empty_table().select(columns)]
+    return pa.concat_tables(tables).to_pandas()
+
+
+def _sorted_path(token, sort_by, ascending):
+    # The first sort on a column writes a sorted copy next to the data, so every later
+    # window of that sort order is a contiguous range read like the unsorted one.
+    # The copies count towards the size of the entry and are evicted with it, an entry keeps at
+    # most MAX_SORTED_COPIES of them (the least recently used ones are removed).
+    digest = hashlib.sha1(str(sort_by).encode('utf-8')).hexdigest()[:16]
+    path = os.path.join(_entry_dir(token), f"sorted-{digest}-{'asc' if ascending else 'desc'}.parquet")
+    if os.path.exists(path):
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass # removed by another worker in the meantime
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        _write_sorted(dataset_path(token), tmp_path, sort_by, ascending)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _limit_sorted_copies(token, keep=path)
+    return path
+
+
+def _write_sorted(data, path, sort_by, ascending):
+    # Only the sort column is read to compute the order. The rows are copied once to an
+    # uncompressed Arrow file that is memory mapped, and every row group of the sorted copy is
+    # taken from it, so memory stays at the sort column, the order and one row group.
+    parquet_file = pq.ParquetFile(data)
+    schema = parquet_file.schema_arrow
+    if sort_by not in schema.names:
+        raise KeyError(f"Column {sort_by} is not in {data}")
+    key = parquet_file.read(columns=[sort_by]).column(sort_by)
+    if pa.types.is_dictionary(key.type):
+        key = key.cast(key.type.value_type) # categories are sorted by their values
+    order = pc.sort_indices(key, sort_keys=[('', 'ascending' if ascending else 'descending')])
+    del key
+
+    # The row groups can have different dictionaries and the Arrow file only one, so categories
+    # are stored as their values and encoded again with the categories of all row groups (a dict
+    # keeps them in the order they were first seen)
+    dictionaries = {field.name: {} for field in schema if pa.types.is_dictionary(field.type)}
+    plain_schema = pa.schema([pa.field(field.name, field.type.value_type) if field.name in dictionaries else field for field in schema],
+                             metadata=schema.metadata)
+    rows_path = f'{path}.arrow'
+    try:
+        with pa.OSFile(rows_path, 'wb') as sink, pa.ipc.new_file(sink, plain_schema) as writer:
+            for group in range(parquet_file.num_row_groups):
+                table = parquet_file.read_row_group(group)
+                for name, categories in dictionaries.items():
+                    for chunk in table.column(name).chunks:
+                        categories.update(dict.fromkeys(chunk.dictionary.to_pylist()))
+                writer.write_table(table.cast(plain_schema))
+            del table
+        dictionaries = {name: pa.array(list(categories), type=schema.field(name).type.value_type) for name, categories in dictionaries.items()}
+        with pa.memory_map(rows_path) as source, pq.ParquetWriter(path, schema) as writer:
+            rows = pa.ipc.open_file(source).read_all()
+            for start in range(0, len(order), ROW_GROUP_ROWS):
+                group = rows.take(order[start:start + ROW_GROUP_ROWS])
+                columns = [_encode(group.column(field.name), dictionaries[field.name], field.type) if field.name in dictionaries else group.column(field.name)
+                           for field in schema]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema), row_group_size=ROW_GROUP_ROWS)
+            del rows, group
+    finally:
+        if os.path.exists(rows_path):
+            os.remove(rows_path)
+
+
+def _encode(values, dictionary, dictionary_type):
+    indices = pc.index_in(values, value_set=dictionary).cast(dictionary_type.index_type)
+    return pa.DictionaryArray.from_arrays(indices.combine_chunks(), dictionary)
+
+
+def _limit_sorted_copies(token, keep=None, max_copies=None):
+    max_copies = MAX_SORTED_COPIES if max_copies is None else max_copies
+    entry = _entry_dir(token)
+    copies = []
+    for name in os.listdir(entry):
+        if name.startswith('sorted-') and name.endswith('.parquet'):
+            try:
+                copies.append((os.path.getmtime(os.path.join(entry, name)), os.path.join(entry, name)))
+            except FileNotFoundError:
+                continue
+    copies.sort(reverse=True)
+    for _, path in copies[max_copies:]:
+        if path != keep:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def load_metadata(token):
+    entry = _entry_dir(token)
+    try:
+        with open(os.path.join(entry, META_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise KeyError(f"Dataset {token} is not in the store (expired or never uploaded)")
+
+
+def update_metadata(token, **values):
+    meta = load_metadata(token)
+    meta.update(values)
+    path = os.path.join(_entry_dir(token), META_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(path + '.tmp', path)
+    return meta
+
+
+def delete_dataset(token):
+    shutil.rmtree(_entry_dir(token), ignore_errors=True)
+
+
+###################################
+## LRU and size based eviction
+
+def _touch(token):
+    # Access time is tracked with the mtime of the entry directory
+    try:
+        os.utime(_entry_dir(token))
+    except FileNotFoundError:
+        pass
+
+
+def _entry_size(entry):
+    total = 0
+    for name in os.listdir(entry):
+        try:
+            total += os.path.getsize(os.path.join(entry, name))
+        except OSError:
+            pass
+    return total
+
+
+def evict(keep=None):
+    if not os.path.isdir(STORE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(STORE_DIR):
+        entry = os.path.join(STORE_DIR, name)
+        if name.endswith('.tmp') or not os.path.isdir(entry):
+            continue
+        try:
+            entries.append((os.path.getmtime(entry), name, _entry_size(entry)))
+        except OSError:
+            continue # removed by another worker in the meantime
+
+    entries.sort() # oldest access first
+    total_size = sum(size for _, _, size in entries)
+    removed = []
+    for _, name, size in entries:
+        if len(entries) - len(removed) <= MAX_STORE_ENTRIES and total_size <= MAX_STORE_BYTES:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(os.path.join(STORE_DIR, name), ignore_errors=True)
+        total_size -= size
+        removed.append(name)
+    return removed
@@ -0,0 +1,95 @@
+import os
+import time
+import sqlite3
+import hashlib
+import tempfile
+
+
+###################################
+## Persistent cache for generated descriptions
+# Keyed by a hash of the model and the full prompt, so uploading the same file again returns
+# the description instantly without calling the API. Entries expire after a TTL and the
+# least recently used ones are removed when the cache grows too large.
+# The cache is a SQLite file, so it is shared between all server workers.
+
+CACHE_PATH = os.environ.get('DESCRIPTION_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'openml_uploader_descriptions.sqlite'))
+CACHE_ENABLED = os.environ.get('DESCRIPTION_CACHE_ENABLED', '1') not in ('0', 'false', 'False', '')
+CACHE_TTL = int(os.environ.get('DESCRIPTION_CACHE_TTL', 30 * 24 * 60 * 60)) # 30 days
+CACHE_MAX_ENTRIES = int(os.environ.get('DESCRIPTION_CACHE_MAX_ENTRIES', 5000))
+CACHE_MAX_BYTES = int(os.environ.get('DESCRIPTION_CACHE_MAX_BYTES', 50 * 1024 * 1024)) # 50MB of descriptions
+
+
+def _connect():
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    conn.execute("""CREATE TABLE IF NOT EXISTS descriptions (
+        key TEXT PRIMARY KEY,
+        model TEXT,
+        description TEXT,
+        size INTEGER,
+        created REAL,
+        last_access REAL)""")
+    conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+    return conn
+
+
+def _count(conn, name, amount=1):
+    conn.execute("INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+                 (name, amount, amount))
+
+
+def cache_key(model, prompt):
+    return hashlib.sha256(f'{model}\0{prompt}'.encode('utf-8')).hexdigest()
+
+
+def get_description(key):
+    now = time.time()
+    with _connect() as conn:
+        row = conn.execute('SELECT description, created FROM descriptions WHERE key = ?', (key,)).fetchone()
+        if row is not None and now - row[1] <= CACHE_TTL:
+            conn.execute('UPDATE descriptions SET last_access = ? WHERE key = ?', (now, key))
+            _count(conn, 'hits')
+            return row[0]
+        if row is not None:
+            # Expired
+            conn.execute('DELETE FROM descriptions WHERE key = ?', (key,))
+            _count(conn, 'evictions')
+        _count(conn, 'misses')
+    return None
+
+
+def put_description(key, model, description):
+    now = time.time()
+    with _connect() as conn:
+        conn.execute('INSERT OR REPLACE INTO descriptions (key, model, description, size, created, last_access) VALUES (?, ?, ?, ?, ?, ?)',
+                     (key, model, description, len(description.encode('utf-8')), now, now))
+        _evict(conn, now)
+
+
+def _evict(conn, now):
+    removed = conn.execute('DELETE FROM descriptions WHERE created < ?', (now - CACHE_TTL,)).rowcount
+    entries, total_size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM descriptions').fetchone()
+    if entries > CACHE_MAX_ENTRIES or total_size > CACHE_MAX_BYTES:
+        # Remove least recently used entries until both limits hold
+        for key, size in conn.execute('SELECT key, size FROM descriptions ORDER BY last_access').fetchall():
+            if entries <= CACHE_MAX_ENTRIES and total_size <= CACHE_MAX_BYTES:
+                break
+            conn.execute('DELETE FROM descriptions WHERE key = ?', (key,))
+            entries -= 1
+            total_size -= size
+            removed += 1
+    if removed:
+        _count(conn, 'evictions', removed)
+
+
+def cache_stats():
+    with _connect() as conn:
+        stats = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+        entries, total_size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM descriptions').fetchone()
+    return {'hits': stats.get('hits', 0), 'misses': stats.get('misses', 0), 'evictions': stats.get('evictions', 0),
+            'entries': entries, 'bytes': total_size}
+
+
+def clear_cache():
+    with _connect() as conn:
+        conn.execute('DELETE FROM descriptions')
+        conn.execute('DELETE FROM counters')
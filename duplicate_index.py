@@ -0,0 +1,193 @@
+import os
+import time
+import base64
+import sqlite3
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+from feature_cache import hash_column, column_digest
+
+
+###################################
+## Index of the published datasets, finds duplicates before they are uploaded again
+# Every dataset that was published gets a content hash (column names and the digests of their
+# values) and a MinHash signature of the distinct values of every column, next to its OpenML URL.
+# An exact duplicate has the same content hash. Near duplicates are found through LSH: the
+# signatures are cut into bands and datasets that share a band of a column are compared, the
+# similarity is the estimated Jaccard similarity of the columns, weighted by their distinct values
+# over the columns of both datasets.
+# The index is a SQLite file, so it is shared between all server workers.
+
+INDEX_PATH = os.environ.get('DUPLICATE_INDEX_PATH', os.path.join(tempfile.gettempdir(), 'openml_uploader_published.sqlite'))
+INDEX_ENABLED = os.environ.get('DUPLICATE_INDEX_ENABLED', '1') not in ('0', 'false', 'False', '')
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.9))
+MINHASH_BINS = 128 # one permutation hashing: the first 7 bits of a value hash choose the bin
+BAND_SIZE = 4 # 32 bands, datasets with a column similarity above ~0.4 become candidates
+LSH_MIN_DISTINCT = 20 # columns with fewer values (booleans, small categories) match everything
+EMPTY = np.uint32(0xFFFFFFFF)
+
+
+def minhash_signature(hashes, bins=MINHASH_BINS):
+    # Smallest hash in every bin, the lower 32 bits are kept. Empty bins take the value of the
+    # next filled bin (rotation densification), so columns with few values are comparable too.
+    signature = np.full(bins, EMPTY, dtype=np.uint32)
+    values = pd.unique(hashes)
+    if len(values) == 0:
+        return signature
+    shift = np.uint64(64 - (bins.bit_length() - 1))
+    minima = pd.Series(values & np.uint64(0xFFFFFFFF)).groupby(values >> shift).min()
+    signature[minima.index.to_numpy()] = minima.to_numpy()
+    filled = np.flatnonzero(signature != EMPTY)
+    empty = np.flatnonzero(signature == EMPTY)
+    if len(empty):
+        nearest = filled[np.searchsorted(filled, empty) % len(filled)]
+        distance = (nearest - empty) % bins
+        signature[empty] = (signature[nearest].astype(np.uint64) + distance.astype(np.uint64) * np.uint64(0x9E3779B1)).astype(np.uint32)
+    return signature
+
+
+def encode_signature(signature):
+    # Text form of a signature, it is stored in the dataset profile
+    return base64.b64encode(signature.astype('<u4').tobytes()).decode('ascii')
+
+
+def decode_signature(text):
+    return np.frombuffer(base64.b64decode(text), dtype='<u4')
+
+
+def similarity(first, second):
+    # Estimated Jaccard similarity of the distinct values of two columns
+    return float(np.mean(first == second))
+
+
+def dataset_signature(df, profile=None):
+    # {'content_hash', 'rows', 'columns': [{'name', 'distinct', 'minhash'}]}
+    # The digests and signatures of the profile are used when it has them, otherwise the
+    # columns are hashed.
+    profile = profile or {}
+    columns = []
+    content = hashlib.blake2b(digest_size=16)
+    content.update(str(len(df)).encode('utf-8'))
+    for nr, col in enumerate(df.columns):
+        column_profile = profile.get(str(col)) or {}
+        if column_profile.get('minhash') and column_profile.get('digest'):
+            digest, signature, distinct = column_profile['digest'], decode_signature(column_profile['minhash']), column_profile['distinct']
+        else:
+            column = df.iloc[:, nr]
+            hashes = hash_column(column)
+            present = column.notna().to_numpy()
+            digest, signature, distinct = column_digest(hashes), minhash_signature(hashes[present]), len(pd.unique(hashes[present]))
+        content.update(f'{col}\0{digest}\0'.encode('utf-8'))
+        columns.append({'name': str(col), 'distinct': int(distinct), 'minhash': signature})
+    return {'content_hash': content.hexdigest(), 'rows': len(df), 'columns': columns}
+
+
+def _bands(signature):
+    # One 63 bit key per band, the band number is part of it
+    return [int.from_bytes(hashlib.blake2b(bytes([nr]) + signature[start:start + BAND_SIZE].tobytes(), digest_size=8).digest(), 'little') >> 1
+            for nr, start in enumerate(range(0, len(signature), BAND_SIZE))]
+
+
+def _connect():
+    conn = sqlite3.connect(INDEX_PATH, timeout=30)
+    conn.execute("""CREATE TABLE IF NOT EXISTS datasets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content_hash TEXT,
+        openml_url TEXT,
+        name TEXT,
+        rows INTEGER,
+        n_columns INTEGER,
+        published REAL)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS datasets_content_hash ON datasets (content_hash)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS columns (
+        dataset_id INTEGER, nr INTEGER, name TEXT, distinct_values INTEGER, minhash BLOB,
+        PRIMARY KEY (dataset_id, nr))""")
+    conn.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER, dataset_id INTEGER, nr INTEGER)")
+    conn.execute("CREATE INDEX IF NOT EXISTS bands_band ON bands (band)")
+    return conn
+
+
+def record_dataset(signature, openml_url, name=None):
+    # Called after a successful publish
+    with _connect() as conn:
+        dataset_id = conn.execute('INSERT INTO datasets (content_hash, openml_url, name, rows, n_columns, published) VALUES (?, ?, ?, ?, ?, ?)',
+                                  (signature['content_hash'], openml_url, name, signature['rows'], len(signature['columns']), time.time())).lastrowid
+        conn.executemany('INSERT INTO columns (dataset_id, nr, name, distinct_values, minhash) VALUES (?, ?, ?, ?, ?)',
+                         [(dataset_id, nr, column['name'], column['distinct'], column['minhash'].astype('<u4').tobytes())
+                          for nr, column in enumerate(signature['columns'])])
+        conn.executemany('INSERT INTO bands (band, dataset_id, nr) VALUES (?, ?, ?)',
+                         [(band, dataset_id, nr) for nr, column in enumerate(signature['columns']) if column['distinct'] >= LSH_MIN_DISTINCT
+                          for band in _bands(column['minhash'])])
+    return dataset_id
+
+
+def _score(signature, stored):
+    # Weighted over the columns of both datasets: every new column is paired with the stored column
+    # of the same name, or else with the most similar stored column that is still free. A pair counts
+    # with the larger of the two distinct counts, a column without a pair (on either side) counts as 0,
+    # so a dataset that holds only a few columns of the other one scores at its real overlap.
+    names = {name: nr for nr, (name, _, _) in enumerate(stored)}
+    signatures = np.stack([minhash for _, _, minhash in stored]) if stored else np.empty((0, MINHASH_BINS), dtype=np.uint32)
+    free = np.ones(len(stored), dtype=bool)
+    pairs, unnamed = [], []
+    for column in signature['columns']:
+        if column['name'] in names:
+            nr = names[column['name']]
+            free[nr] = False
+            pairs.append((column, nr, similarity(column['minhash'], signatures[nr])))
+        else:
+            unnamed.append(column)
+    for column in unnamed:
+        scores = np.where(free, (signatures == column['minhash']).mean(axis=1), -1.0)
+        nr = int(scores.argmax()) if free.any() else None
+        if nr is not None:
+            free[nr] = False
+        pairs.append((column, nr, float(scores[nr]) if nr is not None else 0.0))
+    weights, total = 0, 0.0
+    for column, nr, best in pairs:
+        weight = max(column['distinct'], stored[nr][1] if nr is not None else 0, 1)
+        weights += weight
+        total += weight * best
+    weights += sum(max(distinct, 1) for (_, distinct, _), unpaired in zip(stored, free) if unpaired)
+    return total / weights if weights else 0.0
+
+
+def find_duplicates(signature, threshold=NEAR_DUPLICATE_THRESHOLD, limit=5):
+    # Published datasets that are the same ('exact') or similar ('near'), most similar first:
+    # [{'openml_url', 'name', 'published', 'match', 'similarity'}]
+    with _connect() as conn:
+        exact = conn.execute('SELECT id, openml_url, name, published FROM datasets WHERE content_hash = ? ORDER BY published DESC',
+                             (signature['content_hash'],)).fetchall()
+        matches = [{'openml_url': url, 'name': name, 'published': published, 'match': 'exact', 'similarity': 1.0}
+                   for _, url, name, published in exact]
+        seen = {dataset_id for dataset_id, _, _, _ in exact}
+
+        bands = [band for column in signature['columns'] if column['distinct'] >= LSH_MIN_DISTINCT for band in _bands(column['minhash'])]
+        candidates = set()
+        for start in range(0, len(bands), 500): # SQLite limits the number of parameters
+            chunk = bands[start:start + 500]
+            candidates.update(row[0] for row in conn.execute(f'SELECT DISTINCT dataset_id FROM bands WHERE band IN ({", ".join("?" * len(chunk))})', chunk))
+
+        near = []
+        for dataset_id in candidates - seen:
+            stored = [(name, distinct, np.frombuffer(minhash, dtype='<u4')) for name, distinct, minhash in
+                      conn.execute('SELECT name, distinct_values, minhash FROM columns WHERE dataset_id = ? ORDER BY nr', (dataset_id,))]
+            score = _score(signature, stored)
+            if score >= threshold:
+                url, name, published = conn.execute('SELECT openml_url, name, published FROM datasets WHERE id = ?', (dataset_id,)).fetchone()
+                near.append({'openml_url': url, 'name': name, 'published': published, 'match': 'near', 'similarity': score})
+    near.sort(key=lambda match: -match['similarity'])
+    return (matches + near)[:limit]
+
+
+def duplicate_message(matches):
+    return "; ".join(f"{match['openml_url']} (" + ('same data' if match['match'] == 'exact' else f"{match['similarity']:.0%} similar") + ")"
+                     for match in matches)
+
+
+def clear_index():
+    with _connect() as conn:
+        conn.execute('DELETE FROM bands')
+        conn.execute('DELETE FROM columns')
+        conn.execute('DELETE FROM datasets')
@@ -0,0 +1,80 @@
+import time
+import json
+import uuid
+import random
+import argparse
+from flask import Flask, Response, request, jsonify
+
+
+###################################
+## Local stand-in for the OpenAI chat completions API
+# Answers /v1/chat/completions (normal and streamed) with a canned description, so the
+# description generation can be tested and benchmarked without network or API key.
+# Usage:
+#   python fake_openai_server.py --port 8001 --token-delay 0.02
+#   OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python whole_app.py
+
+def canned_description(prompt, words=200):
+    # Build an answer that mentions the columns of the prompt, so it looks like a real description
+    columns = prompt.split('Columns :')[-1][:500]
+    text = ("Description: This dataset was uploaded for testing. It contains the columns " + columns +
+            " Atttirbute Description: every attribute is described by its sample values. "
+            "Use Case: benchmarking the dataset uploader. ")
+    tokens = text.split(' ')
+    while len(tokens) < words:
+        tokens += tokens
+    return ' '.join(tokens[:words])
+
+
+def create_app(latency=0.0, token_delay=0.01, error_rate=0.0, words=200):
+    app = Flask(__name__)
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    def chat_completions():
+        body = request.get_json(force=True)
+        time.sleep(latency)
+        if random.random() < error_rate:
+            return jsonify(error={'message': 'Injected error', 'type': 'server_error'}), 500
+
+        prompt = body['messages'][-1]['content']
+        model = body.get('model', 'fake-model')
+        completion_id = 'chatcmpl-' + uuid.uuid4().hex
+        created = int(time.time())
+        text = canned_description(prompt, words)
+
+        if not body.get('stream'):
+            time.sleep(token_delay * words)
+            return jsonify({
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': words, 'total_tokens': len(prompt.split()) + words},
+            })
+
+        def events():
+            def chunk(delta, finish_reason=None):
+                data = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+                return f"data: {json.dumps(data)}\n\n"
+
+            yield chunk({'role': 'assistant', 'content': ''})
+            for nr, token in enumerate(text.split(' ')):
+                time.sleep(token_delay)
+                yield chunk({'content': token if nr == 0 else ' ' + token})
+            yield chunk({}, 'stop')
+            yield "data: [DONE]\n\n"
+
+        return Response(events(), mimetype='text/event-stream')
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local OpenAI compatible server for offline tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before the first token')
+    parser.add_argument('--token-delay', type=float, default=0.01, help='seconds between tokens')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with HTTP 500')
+    parser.add_argument('--words', type=int, default=200, help='length of the answer')
+    args = parser.parse_args()
+    create_app(args.latency, args.token_delay, args.error_rate, args.words).run(host=args.host, port=args.port, threaded=True)
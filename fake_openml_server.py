@@ -0,0 +1,127 @@
+import os
+import gzip
+import time
+import random
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+import arff
+from flask import Flask, Response, request, jsonify
+
+
+###################################
+## Local stand-in for the OpenML dataset upload API
+# Answers POST /api/v1/xml/data like www.openml.org: the description XML and the ARFF file are
+# validated and the dataset gets a new id. Latency and server errors can be injected, so the
+# publish step can be tested and benchmarked without network, API key or a real upload.
+# Usage:
+#   python fake_openml_server.py --port 8002 --latency 0.5 --error-rate 0.1
+#   OPENML_SERVER=http://127.0.0.1:8002/api/v1/xml python whole_app.py
+
+OML_NAMESPACE = 'http://openml.org/openml'
+DATABASE_ERROR = 107 # the openml client retries this error, others are raised
+
+
+def xml_response(body, status=200):
+    # Compressed like the real server, the openml client warns about uncompressed answers
+    response = Response(gzip.compress(body.encode('utf-8')), status=status, mimetype='text/xml')
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def oml_error(code, message, additional_information=None, status=412):
+    extra = f'<oml:additional_information>{additional_information}</oml:additional_information>' if additional_information else ''
+    return xml_response(f'<oml:error xmlns:oml="{OML_NAMESPACE}"><oml:code>{code}</oml:code>'
+                        f'<oml:message>{message}</oml:message>{extra}</oml:error>', status)
+
+
+def parse_description(text):
+    # {field: value} of the dataset description, repeated fields (ignore_attribute) become lists
+    root = ET.fromstring(text)
+    if root.tag != f'{{{OML_NAMESPACE}}}data_set_description':
+        raise ValueError(f'Unexpected root element {root.tag}')
+    description = {}
+    for element in root:
+        field = element.tag.split('}')[-1]
+        if field in description:
+            description[field] = [description[field]] if not isinstance(description[field], list) else description[field]
+            description[field].append(element.text)
+        else:
+            description[field] = element.text
+    for field in ('name', 'description', 'format'):
+        if not description.get(field):
+            raise ValueError(f'Missing {field}')
+    return description
+
+
+def validate_dataset(description, text):
+    # The ARFF file must be readable and the special columns must be attributes of it
+    data = arff.loads(text)
+    names = [name for name, _ in data['attributes']]
+    for field in ('default_target_attribute', 'row_id_attribute', 'ignore_attribute'):
+        values = description.get(field) or []
+        for value in values if isinstance(values, list) else values.split(','):
+            if value not in names:
+                raise ValueError(f'{field} {value} is not an attribute of the dataset')
+    return len(data['data']), len(names)
+
+
+def create_app(latency=0.0, error_rate=0.0, error_code=DATABASE_ERROR, store_dir=None):
+    app = Flask(__name__)
+    uploads = []
+    lock = threading.Lock()
+
+    @app.route('/api/v1/xml/data', methods=['POST'])
+    @app.route('/api/v1/xml/data/', methods=['POST'])
+    def upload_dataset():
+        time.sleep(latency)
+        if random.random() < error_rate:
+            return oml_error(error_code, 'Injected error')
+        if not request.form.get('api_key'):
+            return oml_error(102, 'Authentication failed', 'No API key given')
+
+        files = {name: request.files[name].read().decode('utf-8') for name in ('description', 'dataset') if name in request.files}
+        if 'description' not in files:
+            return oml_error(130, 'Problem with file uploading', 'No description file')
+        try:
+            description = parse_description(files['description'])
+        except (ET.ParseError, ValueError) as e:
+            return oml_error(131, 'Problem validating uploaded description file', str(e))
+        if 'dataset' not in files:
+            return oml_error(141, 'Problem with file uploading', 'No dataset file')
+        try:
+            n_rows, n_columns = validate_dataset(description, files['dataset'])
+        except (arff.ArffException, ValueError) as e:
+            return oml_error(145, 'Problem validating uploaded data file', str(e))
+
+        with lock:
+            dataset_id = len(uploads) + 1
+            uploads.append({'id': dataset_id, 'name': description['name'], 'rows': n_rows, 'columns': n_columns,
+                            'bytes': len(files['dataset'].encode('utf-8')), 'received': time.time()})
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+            for name, text in files.items():
+                with open(os.path.join(store_dir, f'{dataset_id}_{name}.{"xml" if name == "description" else "arff"}'), 'w') as f:
+                    f.write(text)
+
+        return xml_response(f'<oml:upload_data_set xmlns:oml="{OML_NAMESPACE}"><oml:id>{dataset_id}</oml:id></oml:upload_data_set>')
+
+    @app.route('/uploads')
+    def list_uploads():
+        # Not part of the OpenML API, lets tests and benchmarks check what was received
+        with lock:
+            return jsonify(uploads)
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local OpenML dataset upload server for offline tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8002)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before every answer')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of uploads answered with an error')
+    parser.add_argument('--error-code', type=int, default=DATABASE_ERROR, help='OpenML error code of the injected errors (107 is retried by the client)')
+    parser.add_argument('--store-dir', help='directory to keep the received description and ARFF files')
+    args = parser.parse_args()
+    create_app(args.latency, args.error_rate, args.error_code, args.store_dir).run(host=args.host, port=args.port, threaded=True)
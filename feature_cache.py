@@ -0,0 +1,83 @@
+import os
+import time
+import sqlite3
+import hashlib
+import tempfile
+import pandas as pd
+
+
+###################################
+## Cache of feature type predictions per column
+# Every column gets a cheap fingerprint (name, dtype, length and a hash of the values).
+# Re-clicking "Generate Feature Types", re-uploading the same file or uploading a dataset that
+# shares columns with an earlier one only runs sortinghat on the columns that are new.
+# The cache is a SQLite file, so it is shared between all server workers.
+
+CACHE_PATH = os.environ.get('FEATURE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'openml_uploader_features.sqlite'))
+CACHE_ENABLED = os.environ.get('FEATURE_CACHE_ENABLED', '1') not in ('0', 'false', 'False', '')
+CACHE_MAX_ENTRIES = int(os.environ.get('FEATURE_CACHE_MAX_ENTRIES', 100000))
+
+
+def _connect():
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    conn.execute("""CREATE TABLE IF NOT EXISTS feature_types (
+        fingerprint TEXT PRIMARY KEY,
+        sortinghat_type TEXT,
+        confidence REAL,
+        last_access REAL)""")
+    return conn
+
+
+def hash_column(column):
+    # One 64 bit hash per value, the dataset profile reuses them for the cardinality estimate
+    try:
+        return pd.util.hash_pandas_object(column, index=False).to_numpy()
+    except TypeError:
+        # Unhashable values (lists, dicts) are hashed by their text
+        return pd.util.hash_pandas_object(column.astype(str), index=False).to_numpy()
+
+
+def column_digest(hashes):
+    return hashlib.blake2b(hashes.tobytes(), digest_size=16).hexdigest()
+
+
+def column_fingerprint(column, salt='', digest=None):
+    # The column name is part of the key because sortinghat uses it as a feature.
+    # salt holds the inference settings, results for other settings are not reused.
+    # digest can be taken from the dataset profile, the values are not hashed again then.
+    if digest is None:
+        digest = column_digest(hash_column(column))
+    return f'{column.name}|{column.dtype}|{len(column)}|{salt}|{digest}'
+
+
+def get_feature_types(fingerprints):
+    # Returns {fingerprint: (sortinghat_type, confidence)} for the cached fingerprints
+    if not fingerprints:
+        return {}
+    found = {}
+    with _connect() as conn:
+        for start in range(0, len(fingerprints), 500): # SQLite limits the number of parameters
+            chunk = fingerprints[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = conn.execute(f'SELECT fingerprint, sortinghat_type, confidence FROM feature_types WHERE fingerprint IN ({placeholders})', chunk)
+            found.update({row[0]: (row[1], row[2]) for row in rows})
+        conn.executemany('UPDATE feature_types SET last_access = ? WHERE fingerprint = ?', [(time.time(), key) for key in found])
+    return found
+
+
+def put_feature_types(results):
+    # results is {fingerprint: (sortinghat_type, confidence)}
+    now = time.time()
+    with _connect() as conn:
+        conn.executemany('INSERT OR REPLACE INTO feature_types (fingerprint, sortinghat_type, confidence, last_access) VALUES (?, ?, ?, ?)',
+                         [(key, col_type, conf, now) for key, (col_type, conf) in results.items()])
+        # Least recently used columns are removed above the limit
+        entries = conn.execute('SELECT COUNT(*) FROM feature_types').fetchone()[0]
+        if entries > CACHE_MAX_ENTRIES:
+            conn.execute('DELETE FROM feature_types WHERE fingerprint IN (SELECT fingerprint FROM feature_types ORDER BY last_access LIMIT ?)',
+                         (entries - CACHE_MAX_ENTRIES,))
+
+
+def clear_cache():
+    with _connect() as conn:
+        conn.execute('DELETE FROM feature_types')
@@ -1,30 +1,185 @@
-import sortinghatinf as shi
-import pandas as pd
-import nltk
-#nltk.download('punkt') 
-# NLTK important for sortinghatinf
-
-
-###################################
-## Function to return predictions of features given a dataset
-def return_predictions_of_features(df):
-    infer_sh = shi.get_sortinghat_types(df) # Get basic sortinghat types
-
-    for col, col_type in zip(df.columns, infer_sh): # If any types are categorical, columns need to be converted to strings 
-        if col_type == 'categorical':
-            df[col] = df[col].astype(str)
-    
-    infer_arff, infer_sh = shi.get_feature_types_as_arff(df)
-    infer_exp = shi.get_expanded_feature_types(df) # Get expanded feature types. These are the most detailed informative.
-
-
-    # If type is not-generlizable the arff type should be a STRING.
-    # This is not used in the application right now but should be kept in mind if implemented.
-
-    for nr,col in enumerate(infer_exp): 
-        if col=="not-generalizable":
-            infer_arff[nr]=(infer_arff[nr][0],"STRING")
-
-
-    return infer_exp, infer_sh, infer_arff
-
+import os
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import feature_cache
+#nltk.download('punkt')
+# NLTK important for sortinghatinf
+
+
+###################################
+## Parameters of the feature type inference
+# Sortinghat only needs a handful of statistics per column, so it runs on a bounded sample of
+# every column. Columns for which the model is not confident on the sample are inferred
+# again on the full column. Columns are split over a process pool for wide tables.
+
+SAMPLE_ROWS = int(os.environ.get('FEATURE_SAMPLE_ROWS', 10000))
+CONFIDENCE_THRESHOLD = float(os.environ.get('FEATURE_CONFIDENCE_THRESHOLD', 0.5))
+INFERENCE_WORKERS = int(os.environ.get('FEATURE_INFERENCE_WORKERS', os.cpu_count() or 1))
+PARALLEL_MIN_CELLS = int(os.environ.get('FEATURE_PARALLEL_MIN_CELLS', 1000000)) # smaller tables are not worth the pool overhead
+
+_pool = None
+
+
+def _get_pool(workers):
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers)
+    return _pool
+
+
+###################################
+## Sampling
+
+def stratified_sample(df, n=SAMPLE_ROWS, seed=0):
+    # The rows are split in n equally sized strata and one random row is taken from each,
+    # so the sample covers the whole file even when it is sorted
+    if len(df) <= n:
+        return df
+    strata = np.linspace(0, len(df), n + 1).astype(np.int64)
+    rng = np.random.default_rng(seed)
+    positions = strata[:-1] + (rng.random(n) * np.diff(strata)).astype(np.int64)
+    return df.iloc[positions].reset_index(drop=True)
+
+
+###################################
+## Sortinghat prediction with confidence
+
+@lru_cache(maxsize=None)
+def sortinghat():
+    # sortinghatinf loads its model and the NLTK data when it is imported, which takes seconds.
+    # It is imported on the first prediction (or by the warm-up, see warmup.py), not at startup.
+    from sortinghatinf import pylib
+    return pylib
+
+
+def predict_types(df):
+    # One featurization and one model call for all columns of df.
+    # The confidence is the random forest probability of the predicted type.
+    shi_pylib = sortinghat()
+    features = shi_pylib.featurize_and_extract(df)
+    model = shi_pylib.Pickled_LR_Model
+    proba = model.predict_proba(features.to_numpy())
+    best = proba.argmax(axis=1)
+    types = [shi_pylib.class_map[int(model.classes_[b])] for b in best]
+    return types, proba.max(axis=1).tolist()
+
+
+def _predict_sharded(df, workers):
+    if workers <= 1 or len(df.columns) < 2 or df.size < PARALLEL_MIN_CELLS:
+        return predict_types(df)
+
+    shards = [shard for shard in np.array_split(np.arange(len(df.columns)), min(workers, len(df.columns))) if len(shard)]
+    types, confidence = [], []
+    for shard_types, shard_confidence in _get_pool(workers).map(predict_types, [df.iloc[:, shard] for shard in shards]):
+        types += shard_types
+        confidence += shard_confidence
+    return types, confidence
+
+
+def _infer_uncached(df, sample_rows, threshold, workers):
+    sample = stratified_sample(df, sample_rows)
+    types, confidence = _predict_sharded(sample, workers)
+
+    # Go back to the full column only where the sample was not conclusive
+    if len(sample) < len(df):
+        low = [nr for nr, conf in enumerate(confidence) if conf < threshold]
+        if low:
+            full_types, full_confidence = _predict_sharded(df.iloc[:, low], workers)
+            for nr, col_type, conf in zip(low, full_types, full_confidence):
+                types[nr] = col_type
+                confidence[nr] = conf
+    return types, confidence
+
+
+def infer_feature_types(df, sample_rows=SAMPLE_ROWS, threshold=CONFIDENCE_THRESHOLD, workers=INFERENCE_WORKERS, use_cache=feature_cache.CACHE_ENABLED, digests=None):
+    if not use_cache:
+        return _infer_uncached(df, sample_rows, threshold, workers)
+
+    # Only the columns that are not in the cache are inferred.
+    # digests (one per column, from the dataset profile) save hashing the values again.
+    salt = f'{sample_rows}:{threshold}'
+    digests = digests or [None] * len(df.columns)
+    fingerprints = [feature_cache.column_fingerprint(df.iloc[:, nr], salt, digests[nr]) for nr in range(len(df.columns))]
+    cached = feature_cache.get_feature_types(fingerprints)
+    missing = [nr for nr, key in enumerate(fingerprints) if key not in cached]
+
+    results = dict(cached)
+    if missing:
+        types, confidence = _infer_uncached(df.iloc[:, missing], sample_rows, threshold, workers)
+        new = {fingerprints[nr]: (col_type, conf) for nr, col_type, conf in zip(missing, types, confidence)}
+        feature_cache.put_feature_types(new)
+        results.update(new)
+
+    return [results[key][0] for key in fingerprints], [results[key][1] for key in fingerprints]
+
+
+###################################
+## Mapping of the sortinghat types (same rules as sortinghatinf, without running the model again)
+
+def expanded_types(df, infer_sh):
+    infer_exp = []
+    for nr, col_type in enumerate(infer_sh):
+        column = df.iloc[:, nr]
+        if col_type == 'numeric':
+            col_type = 'integer' if pd.api.types.is_integer_dtype(column) else 'floating'
+        elif col_type == 'categorical' and pd.api.types.is_bool_dtype(column):
+            col_type = 'boolean'
+        infer_exp.append(col_type)
+    return infer_exp
+
+
+def arff_types(df, infer_sh, profile=None):
+    profile = profile or {}
+    infer_arff = []
+    for nr, col_type in enumerate(infer_sh):
+        column = df.iloc[:, nr]
+        name = str(column.name)
+        if col_type == 'numeric':
+            infer_arff.append((name, 'INTEGER' if pd.api.types.is_integer_dtype(column) else 'REAL'))
+        elif col_type == 'categorical':
+            # ARFF needs string categories, the values are converted without changing the dataframe
+            values = profile.get(name, {}).get('values')
+            if values is None:
+                values = pd.unique(column.dropna().astype(str)).tolist()
+            infer_arff.append((name, sorted(values)))
+        else:
+            # If type is not-generlizable the arff type should be a STRING.
+            # This is not used in the application right now but should be kept in mind if implemented.
+            infer_arff.append((name, 'STRING'))
+    return infer_arff
+
+
+# Sortinghat type for the expanded feature types declared by the file
+EXPANDED_TO_SORTINGHAT = {'integer': 'numeric', 'floating': 'numeric', 'boolean': 'categorical'}
+
+
+###################################
+## Function to return predictions of features given a dataset
+# known_types: {column name: expanded feature type} declared by the file (ARFF). These columns
+# skip sortinghat and get confidence 1.
+# profile: the column profile of the dataset (profiling.py), its hashes and values are reused.
+def return_predictions_of_features(df, known_types=None, profile=None):
+    known_types = known_types or {}
+    profile = profile or {}
+    known = {nr: known_types.get(str(col)) for nr, col in enumerate(df.columns) if known_types.get(str(col))}
+    unknown = [nr for nr in range(len(df.columns)) if nr not in known]
+
+    infer_sh = [None] * len(df.columns)
+    confidence = [1.0] * len(df.columns)
+    if unknown:
+        digests = [profile.get(str(df.columns[nr]), {}).get('digest') for nr in unknown]
+        types, unknown_confidence = infer_feature_types(df.iloc[:, unknown], digests=digests) # Get basic sortinghat types, once for all columns
+        for nr, col_type, conf in zip(unknown, types, unknown_confidence):
+            infer_sh[nr] = col_type
+            confidence[nr] = conf
+    for nr, col_type in known.items():
+        infer_sh[nr] = EXPANDED_TO_SORTINGHAT.get(col_type, col_type)
+
+    infer_exp = expanded_types(df, infer_sh) # Get expanded feature types. These are the most detailed informative.
+    for nr, col_type in known.items():
+        infer_exp[nr] = col_type
+    infer_arff = arff_types(df, infer_sh, profile)
+
+    return infer_exp, infer_sh, infer_arff, confidence
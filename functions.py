@@ -1,45 +1,300 @@
 import pandas as pd
-import openml as oml
+import os
+import tempfile
+import itertools
+import threading
 import dash_ag_grid as dag
-from openai import OpenAI
+from functools import lru_cache
+from description_cache import CACHE_ENABLED, cache_key, get_description, put_description
+from tracing import span
+from streaming_publish import PUBLISH_TMP_DIR, OpenMLAdapter, dataframe_chunks, write_arff
+
+
+###################################
+## Translation of the feature types chosen by the user to ARFF types
+# NOMINAL columns get the list of their distinct values. Columns with more distinct values than
+# MAX_NOMINAL_VALUES are uploaded as STRING instead, a huge NOMINAL header is almost always a mistake.
+
+FEATURE_TYPE_TO_ARFF = {
+    'integer': 'INTEGER',
+    'floating': 'REAL',
+    'boolean': 'NOMINAL',
+    'categorical': 'NOMINAL',
+    'datetime': 'STRING',
+    'sentence': 'STRING',
+    'url': 'STRING',
+    'embedded-number': 'STRING',
+    'list': 'STRING',
+    'not-generalizable': 'STRING',
+    'context-specific': 'STRING',
+}
+MAX_NOMINAL_VALUES = int(os.environ.get('MAX_NOMINAL_VALUES', 1000))
+
+
+def nominal_values(column):
+    # Distinct values as strings, missing values are not a category in ARFF
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Only the categories that occur, without scanning the values again
+        codes = pd.unique(column.cat.codes.to_numpy())
+        values = column.cat.categories.take(codes[codes >= 0])
+    else:
+        values = pd.Index(pd.unique(column.dropna().to_numpy()))
+    return values.astype(str).tolist()
+
+
+def _profiled_nominal(column_profile, column):
+    # Distinct values (or only their number, when there are too many) from the dataset profile.
+    # Without a usable profile the column is scanned.
+    if column_profile is not None and column_profile.get('exact'):
+        if column_profile.get('values') is not None:
+            return column_profile['values'], len(column_profile['values'])
+        return None, column_profile['distinct']
+    values = nominal_values(column)
+    return values, len(values)
+
+
+def build_attributes(df, features, max_nominal_values=MAX_NOMINAL_VALUES, profile=None):
+    # features are the rows of the feature grid: {'FeatureName': ..., 'FeatureTypePublish': ...}
+    # profile is the column profile of the dataset, it usually holds the NOMINAL values already.
+    # Returns the attributes for create_dataset and the columns that were downgraded to STRING
+    profile = profile or {}
+    arff_types = [FEATURE_TYPE_TO_ARFF.get(row['FeatureTypePublish'], 'STRING') for row in features]
+
+    # One pass over every nominal column gives both the cardinality and the values
+    nominal = {row['FeatureName']: _profiled_nominal(profile.get(str(row['FeatureName'])), df[row['FeatureName']])
+               for row, arff_type in zip(features, arff_types) if arff_type == 'NOMINAL'}
+
+    attributes = []
+    downgraded = []
+    for row, arff_type in zip(features, arff_types):
+        name = row['FeatureName']
+        if arff_type == 'NOMINAL':
+            values, count = nominal[name]
+            if count > max_nominal_values:
+                downgraded.append((name, count))
+                attributes.append((name, 'STRING'))
+            else:
+                if values is None: # more values than the profile keeps, but few enough for NOMINAL
+                    values = nominal_values(df[name])
+                attributes.append((name, values))
+        else:
+            attributes.append((name, arff_type))
+    return attributes, downgraded
+
+
+###################################
+## Compact columns for create_dataset
+# The app keeps nullable, Arrow backed and categorical columns from the ingest. liac-arff only
+# understands None and NaN as missing values, so only the columns that contain pd.NA are
+# converted, everything else is passed on as it is.
+
+def arff_compatible(df):
+    converted = {}
+    for col in df.columns:
+        column = df[col]
+        dtype = column.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            if pd.api.types.is_extension_array_dtype(dtype.categories.dtype):
+                # Arrow/string categories would give pd.NA for missing values
+                converted[col] = column.cat.rename_categories(dtype.categories.astype(object))
+            continue
+        if not pd.api.types.is_extension_array_dtype(dtype):
+            continue
+        missing = column.isna()
+        if missing.any():
+            converted[col] = column.astype(object).where(~missing, None)
+    if not converted:
+        return df
+    return df.assign(**converted)
 
 
 ###################################
 ## Function to publish the dataset to OpenML given all the variables
 
-def publish(data,name,description,license,creator,contributor,collection_date,language,attributes,default_target_attribute,ignore_attribute,citation,row_id,api):
-    oml.config.apikey = api
+# OPENML_SERVER points the uploads at another server, e.g. the test server or fake_openml_server.py
+# (http://127.0.0.1:8002/api/v1/xml). OPENML_RETRIES is how often the client retries a failed request.
+OPENML_SERVER = os.environ.get('OPENML_SERVER')
+OPENML_RETRIES = os.environ.get('OPENML_RETRIES')
 
 
-    my_data = oml.datasets.functions.create_dataset(
-        name=name, description=description,
-        licence=license, data=data, creator=creator, contributor=contributor, collection_date=collection_date,
-        language=language, attributes=attributes, default_target_attribute=default_target_attribute, ignore_attribute=ignore_attribute,
-        citation=citation,row_id_attribute=row_id
-    )
+@lru_cache(maxsize=None)
+def openml_module():
+    # openml pulls in scikit-learn, it is imported on the first publish instead of at startup
+    import openml as oml
+    if OPENML_SERVER:
+        oml.config.server = OPENML_SERVER
+    if OPENML_RETRIES:
+        oml.config.connection_n_retries = int(OPENML_RETRIES)
+    return oml
 
-    # Share the dataset on OpenML
-    try:
-        my_data.publish()
-        return (f"URL for dataset: {my_data.openml_url}")
-    except Exception as e:
-        # Catching the general exception and returning its message
-        return f'An error occurred: {str(e)}'
+
+@lru_cache(maxsize=None)
+def openml_adapter():
+    # Checks the openml version once, the streaming publish is only used for supported versions
+    return OpenMLAdapter(openml_module())
+
+
+PUBLISHED_PREFIX = "URL for dataset: "
+
+# oml.config.apikey is global, in-memory publishes running in background threads must not mix up api keys
+_publish_lock = threading.Lock()
+
+
+def _peek_chunk(chunks):
+    # The first chunk with rows and an iterator over all chunks (the empty ones before it are left out)
+    for first in chunks:
+        if len(first):
+            return first, itertools.chain([first], chunks)
+    raise ValueError("The dataset is empty, there are no rows to publish")
+
+
+def _checked_chunks(chunks, check_cancel):
+    for chunk in chunks:
+        if check_cancel is not None:
+            check_cancel()
+        yield chunk
+
+
+def publish(data,name,description,license,creator,contributor,collection_date,language,attributes,default_target_attribute,ignore_attribute,citation,row_id,api,progress=None,check_cancel=None):
+    # progress(stage, fraction) is called between the stages, check_cancel() before every chunk that
+    # is serialized, both are used by the background publish job and raise when it is cancelled.
+    # data is a DataFrame or an iterator of DataFrame chunks (dataset_store.iter_row_groups), it is
+    # written to a temporary ARFF file chunk by chunk and uploaded from there (streaming_publish.py)
+    if progress is None:
+        progress = lambda stage, fraction: None
+    oml = openml_module()
+    adapter = openml_adapter()
+    chunks = dataframe_chunks(data) if isinstance(data, pd.DataFrame) else iter(data)
+    first, chunks = _peek_chunk(chunks)
+    if attributes == 'auto' or isinstance(attributes, dict):
+        # Inferred from the dtypes like create_dataset does, of the whole DataFrame or else the first chunk
+        inferred = oml.datasets.functions.attributes_arff_from_df(arff_compatible(data if isinstance(data, pd.DataFrame) else first))
+        chosen = attributes if isinstance(attributes, dict) else {}
+        attributes = [(col, chosen.get(col, arff_type)) for col, arff_type in inferred]
+
+    def create(df):
+        return oml.datasets.functions.create_dataset(
+            name=name, description=description,
+            licence=license, data=arff_compatible(df), creator=creator, contributor=contributor, collection_date=collection_date,
+            language=language, attributes=attributes, default_target_attribute=default_target_attribute, ignore_attribute=ignore_attribute,
+            citation=citation,row_id_attribute=row_id
+        )
+
+    progress('serialize', 0.1)
+    if not adapter.supported:
+        # openml version the streaming publish was not checked against: create_dataset and publish of openml itself
+        with span('serialize'):
+            df = data if isinstance(data, pd.DataFrame) else pd.concat(list(_checked_chunks(chunks, check_cancel)), ignore_index=True)
+            my_data = create(df)
+        progress('upload', 0.4)
+        try:
+            with _publish_lock, span('upload'):
+                oml.config.apikey = api
+                my_data.publish()
+        except Exception as e:
+            # Catching the general exception and returning its message
+            return f'An error occurred: {str(e)}'
+        progress('server ack', 0.9)
+        return (f"{PUBLISHED_PREFIX}{my_data.openml_url}")
+
+    with tempfile.TemporaryDirectory(dir=PUBLISH_TMP_DIR, prefix='openml_publish_') as directory:
+        path = os.path.join(directory, 'dataset.arff')
+        with span('serialize') as stage:
+            # The description, the ARFF header and the checks of the arguments come from create_dataset on the first row
+            my_data = create(first.iloc[:1])
+            stage['payload_bytes'] = write_arff(path, adapter.arff_header(my_data), attributes, (arff_compatible(chunk) for chunk in chunks), check_cancel)
+            adapter.release_data(my_data)
+
+        # Share the dataset on OpenML
+        progress('upload', 0.4)
+        try:
+            with span('upload'):
+                adapter.upload_dataset(my_data, path, api)
+        except Exception as e:
+            # Catching the general exception and returning its message
+            return f'An error occurred: {str(e)}'
+    progress('server ack', 0.9)
+    return (f"{PUBLISHED_PREFIX}{my_data.openml_url}")
+
+
+def published_url(message):
+    # The OpenML URL in the message of publish, None when the upload has failed
+    if not message.startswith(PUBLISHED_PREFIX):
+        return None
+    return message[len(PUBLISHED_PREFIX):].split()[0]
+
+
+### LANGUAGE NAMES -- Needed for translation between langdetect and accepted API output
+language_names = {
+    "af": "Afrikaans",
+    "ar": "Arabic",
+    "bg": "Bulgarian",
+    "bn": "Bengali",
+    "ca": "Catalan",
+    "cs": "Czech",
+    "cy": "Welsh",
+    "da": "Danish",
+    "de": "German",
+    "el": "Greek",
+    "en": "English",
+    "es": "Spanish",
+    "et": "Estonian",
+    "fa": "Persian",
+    "fi": "Finnish",
+    "fr": "French",
+    "gu": "Gujarati",
+    "he": "Hebrew",
+    "hi": "Hindi",
+    "hr": "Croatian",
+    "hu": "Hungarian",
+    "id": "Indonesian",
+    "it": "Italian",
+    "ja": "Japanese",
+    "kn": "Kannada",
+    "ko": "Korean",
+    "lt": "Lithuanian",
+    "lv": "Latvian",
+    "mk": "Macedonian",
+    "ml": "Malayalam",
+    "mr": "Marathi",
+    "ne": "Nepali",
+    "nl": "Dutch",
+    "no": "Norwegian",
+    "pa": "Punjabi",
+    "pl": "Polish",
+    "pt": "Portuguese",
+    "ro": "Romanian",
+    "ru": "Russian",
+    "sk": "Slovak",
+    "sl": "Slovenian",
+    "so": "Somali",
+    "sq": "Albanian",
+    "sv": "Swedish",
+    "sw": "Swahili",
+    "ta": "Tamil",
+    "te": "Telugu",
+    "th": "Thai",
+    "tl": "Tagalog",
+    "tr": "Turkish",
+    "uk": "Ukrainian",
+    "ur": "Urdu",
+    "vi": "Vietnamese",
+    "zh-cn": "Chinese (Simplified)",
+    "zh-tw": "Chinese (Traditional)"
+}
 
 
 ###################################
 ## GPT API call
+# The key, the server and the model come from the environment. OPENAI_BASE_URL can point at
+# any OpenAI compatible server, e.g. fake_openai_server.py for offline tests and benchmarks.
 
-def chat_api(sampled_values_str):
-    ### change to os 
-    client = OpenAI(
-    # This is the default and can be omitted
-    api_key="",
-    )
-    # Persona pattern prompt
-    # Other prompts can be also explored, just change the text_persona variable
+OPENAI_MODEL = os.environ.get('OPENAI_MODEL', "gpt-4-0125-preview") # "gpt-3.5-turbo"
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 120)) # seconds
 
-    text_persona = """You are the creator of a dataset. You want to upload the dataset to an online repository.
+# Persona pattern prompt
+# Other prompts can be also explored, just change the text_persona variable
+text_persona = """You are the creator of a dataset. You want to upload the dataset to an online repository.
     You are requested to provide a dataset description.
     Knowing the column names and their sample values you will write a concise
     and informative description within 250 words limit without use only ASCII standard characters.
@@ -49,17 +304,76 @@ def chat_api(sampled_values_str):
     Use Case:
 
     """
-    total_prompt = text_persona+sampled_values_str # Concatenating the prompt and the sampled values
 
+
+@lru_cache(maxsize=8)
+def openai_client(timeout=None):
+    # One client (and connection pool) per timeout, reused between requests.
+    # openai is imported here, it takes a second to import and isn't needed until the first upload.
+    from openai import OpenAI
+    return OpenAI(
+        api_key=os.environ.get('OPENAI_API_KEY'),
+        base_url=os.environ.get('OPENAI_BASE_URL') or None, # None is the official API
+        timeout=timeout or OPENAI_TIMEOUT,
+    )
+
+
+def chat_messages(sampled_values_str, persona=text_persona):
+    total_prompt = persona+sampled_values_str # Concatenating the prompt and the sampled values
+    return [
+        {
+            "role": "user",
+            "content": total_prompt,
+        }
+    ]
+
+
+def description_key(sampled_values_str, persona=text_persona):
+    # Cache key of the description, the model and the whole prompt are part of it
+    return cache_key(OPENAI_MODEL, persona+sampled_values_str)
+
+
+def chat_api(sampled_values_str, timeout=None, use_cache=CACHE_ENABLED, persona=text_persona):
+    # persona is replaced for the summaries of column chunks (prompts.py)
+    key = description_key(sampled_values_str, persona)
+    if use_cache:
+        cached = get_description(key)
+        if cached is not None:
+            return cached
+
+    client = openai_client(timeout)
     chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": total_prompt,
-            }
-        ],
-        #model="gpt-3.5-turbo",)
-        model = "gpt-4-0125-preview",)
-    return chat_completion.choices[0].message.content
+        messages=chat_messages(sampled_values_str, persona),
+        model=OPENAI_MODEL,)
+    description = chat_completion.choices[0].message.content
+    if use_cache:
+        put_description(key, OPENAI_MODEL, description)
+    return description
+
 
+def stream_chat_api(sampled_values_str, timeout=None, use_cache=CACHE_ENABLED):
+    # Same request as chat_api, but yields the text as it is generated
+    key = description_key(sampled_values_str)
+    if use_cache:
+        cached = get_description(key)
+        if cached is not None:
+            yield cached
+            return
 
+    client = openai_client(timeout)
+    stream = client.chat.completions.create(
+        messages=chat_messages(sampled_values_str),
+        model=OPENAI_MODEL,
+        stream=True,)
+    text = ''
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                text += chunk.choices[0].delta.content
+                yield chunk.choices[0].delta.content
+    finally:
+        # Closes the connection when the consumer stops early (cancel / timeout)
+        stream.close()
+    # Only complete descriptions are cached
+    if use_cache and text:
+        put_description(key, OPENAI_MODEL, text)
@@ -0,0 +1,695 @@
+import os
+import re
+import csv
+import json
+import codecs
+import zipfile
+import posixpath
+import itertools
+from xml.etree import ElementTree
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from charset_normalizer import from_bytes
+try:
+    import orjson # optional, parses JSON Lines several times faster than the json module
+except ImportError:
+    orjson = None
+
+
+###################################
+## Streaming ARFF reader
+# Reads the file line by line and converts every CHUNK_ROWS rows to typed NumPy buffers, so
+# memory stays close to the size of the final columns instead of a list of Python objects.
+# The dtypes come from the @attribute declarations: numeric/real -> float64, integer -> int64
+# (Int64 with missing values), nominal -> category, date -> datetime64, string -> object.
+# Dates are parsed with the declared (Java SimpleDateFormat) format, ISO 8601 without one, dates
+# with a time zone are converted to UTC. Dense and sparse ({index value, ...}) data rows are supported.
+
+CHUNK_ROWS = 100000
+
+_ATTRIBUTE = re.compile(r"""@attribute\s+('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|\S+)\s+(.+)$""", re.IGNORECASE)
+_TOKEN = re.compile(r"""\s*('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|[^,]*)\s*(?:,|$)""")
+
+# Feature types of the app (see feature-grid) for the declared ARFF types
+ARFF_TO_FEATURE_TYPE = {
+    'numeric': 'floating',
+    'real': 'floating',
+    'integer': 'integer',
+    'nominal': 'categorical',
+    'date': 'datetime',
+    'string': None, # a string can be a sentence, an url, a list, ... sortinghat decides
+}
+
+# strftime directives for the letters of a Java SimpleDateFormat pattern, by number of repeats
+_JAVA_DATE_FIELDS = {
+    'y': {1: '%Y', 2: '%y', 3: '%Y', 4: '%Y'},
+    'M': {1: '%m', 2: '%m', 3: '%b', 4: '%B'},
+    'd': {1: '%d', 2: '%d'},
+    'H': {1: '%H', 2: '%H'},
+    'h': {1: '%I', 2: '%I'},
+    'm': {1: '%M', 2: '%M'},
+    's': {1: '%S', 2: '%S'},
+    'S': {1: '%f', 2: '%f', 3: '%f'},
+    'a': {1: '%p'},
+    'E': {1: '%a', 2: '%a', 3: '%a', 4: '%A'},
+    'Z': {1: '%z'},
+    'X': {1: '%z', 2: '%z', 3: '%z'},
+    'z': {1: '%Z', 2: '%Z', 3: '%Z', 4: '%Z'},
+}
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"'):
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+def _split_values(text):
+    # Fast paths for the common cases: no quotes at all, or one kind of quote (parsed by the csv module)
+    single, double = "'" in text, '"' in text
+    if not single and not double:
+        return [value.strip() for value in text.split(',')]
+    if single != double:
+        values = next(csv.reader([text], quotechar="'" if single else '"', escapechar='\\', skipinitialspace=True))
+        return [value.rstrip() for value in values]
+    values = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        values.append(_unquote(match.group(1)))
+        position = match.end()
+    if text.rstrip().endswith(','):
+        values.append('')
+    return values
+
+
+def _parse_attribute(line):
+    match = _ATTRIBUTE.match(line)
+    if match is None:
+        raise ValueError(f"Invalid attribute declaration: {line}")
+    name = _unquote(match.group(1))
+    declaration = match.group(2).strip()
+    if declaration.startswith('{'):
+        return name, 'nominal', _split_values(declaration[1:declaration.rindex('}')])
+    arff_type = declaration.split()[0].lower()
+    if arff_type not in ARFF_TO_FEATURE_TYPE:
+        raise ValueError(f"Unsupported type {declaration} of attribute {name}")
+    if arff_type == 'date':
+        # The date format takes the place of the categories
+        parts = declaration.split(None, 1)
+        pattern = _unquote(parts[1].strip()) if len(parts) > 1 else None
+        try:
+            return name, arff_type, (pattern, _strftime_format(pattern) if pattern else 'ISO8601')
+        except ValueError:
+            raise ValueError(f"Unsupported date format {pattern} of attribute {name}") from None
+    return name, arff_type, None
+
+
+def _strftime_format(pattern):
+    # Java SimpleDateFormat pattern -> strftime format, text in quotes is literal ('' is a quote)
+    parts = []
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        if char == "'":
+            end = pattern.find("'", position + 1)
+            if end == -1:
+                raise ValueError(pattern)
+            parts.append("'" if end == position + 1 else pattern[position + 1:end].replace('%', '%%'))
+            position = end + 1
+        elif char.isalpha():
+            end = position
+            while end < len(pattern) and pattern[end] == char:
+                end += 1
+            if char not in _JAVA_DATE_FIELDS:
+                raise ValueError(pattern)
+            directives = _JAVA_DATE_FIELDS[char]
+            parts.append(directives[min(end - position, max(directives))])
+            position = end
+        else:
+            parts.append('%%' if char == '%' else char)
+            position += 1
+    return ''.join(parts)
+
+
+def _sparse_to_dense(line, defaults):
+    row = list(defaults)
+    inner = line[1:line.rindex('}')].strip()
+    if inner:
+        for item in _split_values(inner):
+            index, value = item.split(None, 1)
+            row[int(index)] = _unquote(value.strip())
+    return row
+
+
+def _convert_chunk(values, arff_type, categories, name=None, line_numbers=None):
+    # line_numbers are the lines of the values in the file, for the error messages
+    values = np.array(values, dtype=object)
+    missing = values == '?'
+    if arff_type in ('numeric', 'real', 'integer'):
+        values[missing] = np.nan
+        return values.astype(np.float64)
+    if arff_type == 'nominal':
+        codes = pd.Categorical(values, categories=categories).codes # '?' and unknown values become -1
+        undeclared = (codes == -1) & ~missing
+        if undeclared.any():
+            row = int(np.flatnonzero(undeclared)[0])
+            line = f" on line {line_numbers[row]}" if line_numbers is not None else ''
+            raise ValueError(f"Value {values[row]!r} of attribute {name}{line} is not one of its nominal values")
+        return codes
+    if arff_type == 'date':
+        pattern, date_format = categories
+        dates = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+        present = values[~missing]
+        parsed = pd.to_datetime(pd.Series(present, dtype=object), format=date_format, errors='coerce', utc='%z' in date_format or '%Z' in date_format)
+        unparsed = parsed.isna().to_numpy()
+        if unparsed.any():
+            row = int(np.flatnonzero(~missing)[np.flatnonzero(unparsed)[0]])
+            line = f" on line {line_numbers[row]}" if line_numbers is not None else ''
+            raise ValueError(f"Value {values[row]!r} of attribute {name}{line} does not match its date format {pattern or 'ISO 8601'}")
+        if parsed.dt.tz is not None:
+            parsed = parsed.dt.tz_localize(None)
+        dates[~missing] = parsed.to_numpy(dtype='datetime64[ns]')
+        return dates
+    values[missing] = None
+    return values
+
+
+def _finish_column(chunks, arff_type, categories):
+    values = np.concatenate(chunks) if chunks else np.array([])
+    if arff_type in ('numeric', 'real'):
+        return values
+    if arff_type == 'integer':
+        if np.isnan(values).any():
+            return pd.array(values, dtype='Int64')
+        return values.astype(np.int64)
+    if arff_type == 'nominal':
+        return pd.Categorical.from_codes(values.astype(np.int32), categories=categories)
+    if arff_type == 'date':
+        return values.astype('datetime64[ns]')
+    return values
+
+
+def read_arff(path, chunk_rows=CHUNK_ROWS):
+    # Returns the dataframe and the declared feature type of every column
+    attributes = []
+    with open(path, 'r', encoding='utf-8') as f:
+        # Header
+        line_nr = 0
+        for line_nr, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('%'):
+                continue
+            keyword = line.split(None, 1)[0].lower()
+            if keyword == '@attribute':
+                attributes.append(_parse_attribute(line))
+            elif keyword == '@data':
+                break
+        if not attributes:
+            raise ValueError("The ARFF file has no attributes")
+
+        # Omitted values of sparse rows are 0 (the first value for nominal attributes, missing for dates)
+        defaults = [categories[0] if arff_type == 'nominal' else {'string': '', 'date': '?'}.get(arff_type, '0')
+                    for _, arff_type, categories in attributes]
+        buffers = [[] for _ in attributes]
+        rows = []
+        line_numbers = []
+
+        def flush():
+            for nr, column in enumerate(zip(*rows)):
+                name, arff_type, categories = attributes[nr]
+                buffers[nr].append(_convert_chunk(column, arff_type, categories, name, line_numbers))
+            rows.clear()
+            line_numbers.clear()
+
+        # Data
+        for line_nr, line in enumerate(f, line_nr + 1):
+            line = line.strip()
+            if not line or line.startswith('%'):
+                continue
+            if line.startswith('{'):
+                row = _sparse_to_dense(line, defaults)
+            else:
+                row = _split_values(line)
+            if len(row) != len(attributes):
+                raise ValueError(f"Data row has {len(row)} values, expected {len(attributes)}: {line[:100]}")
+            rows.append(row)
+            line_numbers.append(line_nr)
+            if len(rows) >= chunk_rows:
+                flush()
+        flush()
+
+    df = pd.DataFrame({name: _finish_column(buffers[nr], arff_type, categories)
+                       for nr, (name, arff_type, categories) in enumerate(attributes)})
+
+    declared_types = {}
+    for name, arff_type, categories in attributes:
+        feature_type = ARFF_TO_FEATURE_TYPE[arff_type]
+        if arff_type == 'nominal' and sorted(value.lower() for value in categories) == ['false', 'true']:
+            feature_type = 'boolean'
+        declared_types[name] = feature_type
+    return df, declared_types
+
+
+###################################
+## CSV reader
+# Dialect, header and encoding are detected from a bounded prefix of the file only. The file is
+# then parsed by the multithreaded pyarrow reader into Arrow backed columns. Files pyarrow can't
+# parse (e.g. ragged rows) fall back to the pandas C parser.
+
+SNIFF_BYTES = 64 * 1024
+CSV_BLOCK_SIZE = 16 * 1024 * 1024 # bytes per pyarrow parse block, blocks are parsed in parallel
+# Fields that are missing values, the default na_values of pd.read_csv (for string columns too)
+CSV_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                 '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+_BOMS = [(codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+         (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]
+
+
+def detect_encoding(prefix):
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    try:
+        # The prefix can end in the middle of a multi byte character, the incremental decoder allows that
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=len(prefix) < SNIFF_BYTES)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    best = from_bytes(prefix).best()
+    return best.encoding if best is not None else 'latin-1'
+
+
+def sniff_csv(path, sniff_bytes=SNIFF_BYTES):
+    with open(path, 'rb') as f:
+        prefix = f.read(sniff_bytes)
+    encoding = detect_encoding(prefix)
+    sample = prefix.decode(encoding, errors='ignore')
+    if len(prefix) == sniff_bytes and '\n' in sample:
+        sample = sample[:sample.rfind('\n')] # only complete lines
+
+    sniffer = csv.Sniffer()
+    try:
+        dialect = sniffer.sniff(sample, delimiters=',;\t|')
+        delimiter, quotechar = dialect.delimiter, dialect.quotechar
+    except csv.Error:
+        delimiter, quotechar = ',', '"' # single column files can't be sniffed
+    try:
+        has_header = sniffer.has_header(sample)
+    except csv.Error:
+        has_header = True
+    return {'encoding': encoding, 'delimiter': delimiter, 'quotechar': quotechar or '"', 'has_header': has_header}
+
+
+def _read_csv_pyarrow(path, dialect):
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE, encoding=dialect['encoding'],
+                                      autogenerate_column_names=not dialect['has_header'])
+    parse_options = pa_csv.ParseOptions(delimiter=dialect['delimiter'], quote_char=dialect['quotechar'])
+    convert_options = pa_csv.ConvertOptions(null_values=CSV_NA_VALUES, strings_can_be_null=True)
+    table = pa_csv.read_csv(path, read_options=read_options, parse_options=parse_options, convert_options=convert_options)
+
+    # Same column names as pandas: 0, 1, ... without header and 'Unnamed: <nr>' for empty names
+    if dialect['has_header']:
+        names = [name if name != '' else f'Unnamed: {nr}' for nr, name in enumerate(table.column_names)]
+    else:
+        names = [str(nr) for nr in range(table.num_columns)]
+    table = table.rename_columns(names)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _read_csv_pandas(path, dialect):
+    return pd.read_csv(path, delimiter=dialect['delimiter'], quotechar=dialect['quotechar'], encoding=dialect['encoding'],
+                       header=0 if dialect['has_header'] else None)
+
+
+def read_csv(path, engine=None):
+    # engine: 'pyarrow', 'pandas' or None (pyarrow with pandas as fallback)
+    dialect = sniff_csv(path)
+    if engine in (None, 'pyarrow'):
+        try:
+            return _read_csv_pyarrow(path, dialect)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            if engine == 'pyarrow':
+                raise
+    return _read_csv_pandas(path, dialect)
+
+
+###################################
+## Streaming Excel reader
+# Workbooks (.xlsx, .xlsm) are read with openpyxl in read-only mode: the rows of the sheet are
+# streamed from the XML and every EXCEL_CHUNK_ROWS rows are turned into one typed chunk per column, so
+# the cells of the whole sheet never exist as Python objects at once. The sheet names are read
+# from the workbook part only, without parsing any sheet. Old .xls files go through pandas.
+# Like pd.read_excel: the first row is the header, trailing empty rows and columns are dropped
+# and integral floats become integers.
+
+EXCEL_CHUNK_ROWS = 10000 # rows of cell objects before they are converted, the peak memory of the reader
+
+def _relationships(archive, path):
+    # {id: (type, target)} of a .rels part
+    if path not in archive.namelist():
+        return {}
+    root = ElementTree.fromstring(archive.read(path))
+    return {rel.get('Id'): (rel.get('Type', ''), rel.get('Target', '')) for rel in root if rel.tag.endswith('}Relationship')}
+
+
+def excel_sheets(path):
+    # Names of the worksheets in the order of the workbook (chart sheets are left out)
+    if not zipfile.is_zipfile(path):
+        return pd.ExcelFile(path).sheet_names
+    with zipfile.ZipFile(path) as archive:
+        workbook = next(target.lstrip('/') for rel_type, target in _relationships(archive, '_rels/.rels').values()
+                        if rel_type.endswith('/officeDocument'))
+        rels = _relationships(archive, posixpath.join(posixpath.dirname(workbook), '_rels', posixpath.basename(workbook) + '.rels'))
+        root = ElementTree.fromstring(archive.read(workbook))
+        sheets = []
+        for sheet in root.iter():
+            if not sheet.tag.endswith('}sheet'):
+                continue
+            rel_id = next((value for key, value in sheet.attrib.items() if key.endswith('}id')), None)
+            if rels.get(rel_id, ('',))[0].endswith('/worksheet'):
+                sheets.append(sheet.get('name'))
+        return sheets
+
+
+def _excel_chunk(values):
+    column = pd.Series(values)
+    if pd.api.types.is_float_dtype(column.dtype) and not column.isna().any() and (column == column.round()).all():
+        return column.astype(np.int64)
+    return column
+
+
+def _missing_chunk(dtype, rows):
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return pd.Series(pd.NaT, index=range(rows), dtype=dtype)
+    if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+        return pd.Series(np.nan, index=range(rows))
+    return pd.Series([None] * rows, dtype=object)
+
+
+def _finish_chunks(chunks):
+    # Chunks without values take the type of the others, so they don't turn the column into objects
+    present = [chunk for chunk in chunks if chunk.notna().any()]
+    if not present:
+        return pd.Series(np.nan, index=range(sum(len(chunk) for chunk in chunks)))
+    if len(present) < len(chunks):
+        chunks = [chunk if chunk.notna().any() else _missing_chunk(present[0].dtype, len(chunk)) for chunk in chunks]
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0].reset_index(drop=True)
+
+
+def _header_names(values):
+    # 'Unnamed: <nr>' for empty names and '.1', '.2' for repeated names, like pandas
+    names, seen = [], {}
+    for nr, value in enumerate(values):
+        name = f'Unnamed: {nr}' if value is None or str(value) == '' else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        seen.setdefault(name, 0)
+        names.append(name)
+    return names
+
+
+def read_excel(path, sheet=None, chunk_rows=EXCEL_CHUNK_ROWS):
+    # sheet is the name of the worksheet, the first one when None
+    if not zipfile.is_zipfile(path):
+        return pd.read_excel(path, sheet_name=sheet if sheet is not None else 0)
+    import openpyxl
+    # A file object, openpyxl checks the extension of paths and spooled uploads have none
+    with open(path, 'rb') as f:
+        workbook = openpyxl.load_workbook(f, read_only=True, data_only=True, keep_links=False)
+        try:
+            worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+            worksheet.reset_dimensions() # the stored dimensions are often wrong
+            rows = worksheet.iter_rows(values_only=True)
+            header = next((row for row in rows if any(value is not None for value in row)), ())
+            buffers = [[] for _ in header]
+            chunk, empty_rows, n_rows = [], 0, 0
+
+            def flush():
+                columns = list(itertools.zip_longest(*chunk))
+                for nr in range(len(buffers), len(columns)):
+                    # A row that is wider than the header, the earlier rows have no value there
+                    buffers.append([_missing_chunk(object, n_rows)] if n_rows else [])
+                for nr, buffer in enumerate(buffers):
+                    buffer.append(_excel_chunk(columns[nr]) if nr < len(columns) else _missing_chunk(object, len(chunk)))
+
+            for row in rows:
+                if not any(value is not None for value in row):
+                    empty_rows += 1 # only kept when a row with values follows
+                    continue
+                chunk.extend(() for _ in range(empty_rows))
+                empty_rows = 0
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    flush()
+                    n_rows += len(chunk)
+                    chunk = []
+            if chunk:
+                flush()
+                n_rows += len(chunk)
+        finally:
+            workbook.close()
+
+    columns = [_finish_chunks(buffer) if buffer else pd.Series(np.nan, index=range(n_rows)) for buffer in buffers]
+    names = list(header) + [None] * (len(columns) - len(header))
+    # Trailing columns without a name and without values are formatting only
+    while columns and names[-1] is None and columns[-1].isna().all():
+        columns.pop()
+        names.pop()
+    return pd.DataFrame(dict(zip(_header_names(names), columns)), index=pd.RangeIndex(n_rows))
+
+
+###################################
+## Chunked JSON Lines reader
+# NDJSON / JSON Lines files (one JSON object per line) are parsed line by line, every
+# JSON_CHUNK_ROWS records become one chunk per column, so only one chunk of records exists as
+# Python objects at a time. Nested objects are flattened into 'parent.child' columns
+# (pd.json_normalize), lists become JSON text. Records don't need the same keys, a missing key
+# is a missing value. orjson is used when it is installed, otherwise the json module.
+# Other JSON files (a list of records, or pandas' orients) are read by pd.read_json.
+
+JSON_CHUNK_ROWS = 10000
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+
+def _json_parser(parser=None):
+    # parser: 'orjson', 'json' or None (orjson when installed)
+    if parser == 'orjson' or (parser is None and orjson is not None):
+        if orjson is None:
+            raise ValueError("The orjson parser is not installed")
+        return orjson.loads, orjson.JSONDecodeError
+    return json.loads, json.JSONDecodeError
+
+
+def is_json_lines(path, filename=None, sniff_bytes=SNIFF_BYTES):
+    # JSON Lines by the extension, or by the content: the first line is a complete object and
+    # more lines follow (a single line is a record unless all its values are objects, which is
+    # the 'columns' orient of pd.read_json)
+    if (filename or path).lower().endswith(JSON_LINES_EXTENSIONS):
+        return True
+    with open(path, 'rb') as f:
+        prefix = f.read(sniff_bytes)
+    lines = prefix.removeprefix(codecs.BOM_UTF8).lstrip().split(b'\n')
+    if not lines[0].startswith(b'{'):
+        return False
+    try:
+        first = json.loads(lines[0])
+    except ValueError:
+        return False # a pretty printed object
+    if any(line.strip() for line in lines[1:]):
+        return True
+    return isinstance(first, dict) and not all(isinstance(value, dict) for value in first.values())
+
+
+_SCALAR_KINDS = ('string', 'boolean', 'integer', 'floating', 'mixed-integer-float', 'empty')
+
+
+def _json_chunk(records, max_level=None):
+    # Flat records are one DataFrame call, only object columns that hold objects are normalized
+    df = pd.DataFrame(records)
+    columns = {}
+    for col in df.columns:
+        column = df[col]
+        if column.dtype != object or pd.api.types.infer_dtype(column, skipna=True) in _SCALAR_KINDS:
+            columns[col] = column
+            continue
+        is_object = column.map(lambda value: isinstance(value, dict)).to_numpy(dtype=bool)
+        if is_object.any() and (max_level is None or max_level > 0):
+            if not is_object.all() and column[~is_object].notna().any():
+                columns[col] = column.where(~is_object) # records where the key is a value
+            nested = pd.json_normalize([value if is_object[nr] else {} for nr, value in enumerate(column)],
+                                       max_level=None if max_level is None else max_level - 1)
+            columns.update((f'{col}.{name}', nested[name]) for name in nested.columns)
+        else:
+            columns[col] = column
+    for col, column in columns.items():
+        if column.dtype == object and pd.api.types.infer_dtype(column, skipna=True) not in _SCALAR_KINDS:
+            # Lists (and objects below max_level) are kept as their JSON text
+            columns[col] = column.map(lambda value: json.dumps(value) if isinstance(value, (list, dict)) else value)
+    return pd.DataFrame(columns)
+
+
+def read_json_lines(path, parser=None, chunk_rows=JSON_CHUNK_ROWS, max_level=None):
+    # max_level limits how deep nested objects are flattened, None flattens everything
+    loads, decode_error = _json_parser(parser)
+    buffers = {} # column name -> chunks, in the order the columns appear
+    records, n_rows = [], 0
+
+    def flush():
+        chunk = _json_chunk(records, max_level)
+        for col in chunk.columns:
+            if col not in buffers:
+                # A key that only appears in later records, the earlier rows have no value there
+                buffers[col] = [_missing_chunk(object, n_rows)] if n_rows else []
+            buffers[col].append(chunk[col].reset_index(drop=True))
+        for col, buffer in buffers.items():
+            if col not in chunk.columns:
+                buffer.append(_missing_chunk(object, len(records)))
+
+    with open(path, 'rb') as f:
+        for line_nr, line in enumerate(f, 1):
+            if line_nr == 1:
+                line = line.removeprefix(codecs.BOM_UTF8)
+            if not line.strip():
+                continue
+            try:
+                record = loads(line)
+            except decode_error as e:
+                try:
+                    record = json.loads(line) # e.g. integers beyond 64 bit, orjson rejects them
+                except ValueError:
+                    raise ValueError(f"Line {line_nr} is not valid JSON: {e}")
+            if not isinstance(record, dict):
+                record = {'value': record}
+            records.append(record)
+            if len(records) >= chunk_rows:
+                flush()
+                n_rows += len(records)
+                records = []
+        if records:
+            flush()
+            n_rows += len(records)
+
+    return pd.DataFrame({col: _finish_chunks(buffer) for col, buffer in buffers.items()}, index=pd.RangeIndex(n_rows))
+
+
+###################################
+## Any supported file
+# The file type is taken from the file name. Used by the upload page and the batch upload.
+
+FILE_KINDS = ('csv', 'arff', 'xls', 'json', 'parquet')
+
+
+def file_kind(filename):
+    for kind in FILE_KINDS:
+        if kind in filename:
+            return kind
+    return None
+
+
+def read_dataset(path, filename=None, sheet=None):
+    # Returns the dataframe and the declared feature types, only ARFF files declare them.
+    # sheet selects the worksheet of an Excel file.
+    kind = file_kind(filename or os.path.basename(path))
+    declared_types = None
+    if kind == 'csv':
+        df = read_csv(path)
+    elif kind == 'arff':
+        df, declared_types = read_arff(path)
+    elif kind == 'xls':
+        df = read_excel(path, sheet)
+    elif kind == 'json':
+        df = read_json_lines(path) if is_json_lines(path, filename) else pd.read_json(path)
+    elif kind == 'parquet':
+        df = pd.read_parquet(path)
+    else:
+        raise ValueError(f"Not accepted file type: {filename or path}")
+
+    ### Rename the unnamed column to have a name index
+    if 'Unnamed: 0' in df.columns:
+        df = df.rename(columns={'Unnamed: 0': 'Index'})
+    return df, declared_types
+
+
+###################################
+## Memory compact dtypes
+# Every format keeps the default int64/float64/object dtypes of its reader. After reading, integers
+# are downcast to the smallest type that holds their range, floats to float32 when that is lossless
+# and low cardinality strings become categoricals. Nullable and Arrow backed columns keep their backend.
+
+CATEGORY_MAX_RATIO = 0.5 # distinct values / rows below which a string column becomes categorical
+
+_INT_TYPES = [np.int8, np.uint8, np.int16, np.uint16, np.int32, np.uint32, np.int64, np.uint64]
+_NULLABLE_INT_TYPES = {np.int8: 'Int8', np.uint8: 'UInt8', np.int16: 'Int16', np.uint16: 'UInt16',
+                       np.int32: 'Int32', np.uint32: 'UInt32', np.int64: 'Int64', np.uint64: 'UInt64'}
+
+
+def _smallest_int(low, high):
+    for int_type in _INT_TYPES:
+        info = np.iinfo(int_type)
+        if info.min <= low and high <= info.max:
+            return int_type
+    return np.int64
+
+
+def _is_string_column(column):
+    dtype = column.dtype
+    if isinstance(dtype, pd.ArrowDtype):
+        return pa.types.is_string(dtype.pyarrow_dtype) or pa.types.is_large_string(dtype.pyarrow_dtype)
+    if isinstance(dtype, pd.StringDtype):
+        return True
+    return dtype == object and pd.api.types.infer_dtype(column, skipna=True) == 'string'
+
+
+def compact_column(column, category_max_ratio=CATEGORY_MAX_RATIO):
+    dtype = column.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+        return column
+
+    if pd.api.types.is_integer_dtype(dtype):
+        if column.isna().all():
+            return column
+        int_type = _smallest_int(column.min(), column.max())
+        if isinstance(dtype, pd.ArrowDtype):
+            return column.astype(pd.ArrowDtype(pa.from_numpy_dtype(int_type)))
+        if pd.api.types.is_extension_array_dtype(dtype):
+            return column.astype(_NULLABLE_INT_TYPES[int_type])
+        return column.astype(int_type)
+
+    if pd.api.types.is_float_dtype(dtype):
+        values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+        as_float32 = values.astype(np.float32)
+        if not np.array_equal(as_float32.astype(np.float64), values, equal_nan=True):
+            return column # float32 would change the values
+        if isinstance(dtype, pd.ArrowDtype):
+            return column.astype(pd.ArrowDtype(pa.float32()))
+        if pd.api.types.is_extension_array_dtype(dtype):
+            return column.astype('Float32')
+        return column.astype(np.float32)
+
+    if _is_string_column(column) and len(column):
+        if column.nunique(dropna=True) <= category_max_ratio * len(column):
+            if isinstance(dtype, pd.ArrowDtype):
+                # Dictionary encoded by Arrow, only the distinct values become Python strings
+                encoded = pa.chunked_array(pa.array(column.array)).combine_chunks().dictionary_encode()
+                codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+                categories = pd.Index(encoded.dictionary.to_pylist(), dtype=object)
+                return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=column.index, name=column.name)
+            return column.astype('category')
+    return column
+
+
+def optimize_dtypes(df, category_max_ratio=CATEGORY_MAX_RATIO):
+    # Returns the compact dataframe and the memory before/after of every column
+    report = []
+    columns = {}
+    for col in df.columns:
+        before = int(df[col].memory_usage(deep=True, index=False))
+        columns[col] = compact_column(df[col], category_max_ratio)
+        report.append({'column': str(col), 'dtype_before': str(df[col].dtype), 'dtype_after': str(columns[col].dtype),
+                       'bytes_before': before, 'bytes_after': int(columns[col].memory_usage(deep=True, index=False))})
+    return pd.DataFrame(columns, index=df.index), report
@@ -0,0 +1,187 @@
+import os
+import time
+import uuid
+import sqlite3
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+###################################
+## Background jobs
+# Long running work (publishing to OpenML) runs in a background thread instead of inside
+# the Dash request. The state of every job is kept in a local SQLite database, so any server
+# worker can answer the progress polls of the UI and cancel a job.
+# Every kind of job has its own threads, so long description jobs never queue a publish.
+# A running job is a thread of the worker that submitted it. The worker renews the lease of its
+# jobs every JOB_HEARTBEAT seconds, jobs whose lease has run out (the worker was restarted or
+# killed) are marked as failed when a worker starts.
+
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join(tempfile.gettempdir(), 'openml_uploader_jobs.sqlite'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4)) # threads per kind of job, JOB_WORKERS_<KIND> for one kind
+JOB_MAX_AGE = int(os.environ.get('JOB_MAX_AGE', 7 * 24 * 60 * 60)) # finished jobs are kept for a week
+JOB_HEARTBEAT = int(os.environ.get('JOB_HEARTBEAT', 30)) # seconds between the lease renewals of running jobs
+JOB_LEASE = int(os.environ.get('JOB_LEASE', 5 * 60)) # queued or running jobs without renewal for this long are lost
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+_executors = {} # kind -> ThreadPoolExecutor
+_executors_lock = threading.Lock()
+_active = set() # ids of the jobs of this process that are queued or running
+_active_lock = threading.Lock()
+_heartbeat = None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _connect():
+    conn = sqlite3.connect(JOB_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT,
+        status TEXT,
+        stage TEXT,
+        progress REAL,
+        message TEXT,
+        result TEXT,
+        error TEXT,
+        cancel_requested INTEGER DEFAULT 0,
+        cancellable INTEGER DEFAULT 1,
+        created REAL,
+        updated REAL)""")
+    return conn
+
+
+def _init_db():
+    # Once per process: adds the columns of newer versions and fails the jobs of stopped workers
+    with _connect() as conn:
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+        if 'cancellable' not in columns:
+            conn.execute('ALTER TABLE jobs ADD COLUMN cancellable INTEGER DEFAULT 1')
+        now = time.time()
+        conn.execute('UPDATE jobs SET status = ?, message = ?, updated = ? WHERE status IN (?, ?) AND updated < ?',
+                     (FAILED, 'The server worker running the job has stopped', now, QUEUED, RUNNING, now - JOB_LEASE))
+
+
+def _executor(kind):
+    with _executors_lock:
+        if kind not in _executors:
+            workers = int(os.environ.get(f'JOB_WORKERS_{kind.upper()}', JOB_WORKERS))
+            _executors[kind] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'job-{kind}')
+        return _executors[kind]
+
+
+def _renew_leases():
+    while True:
+        time.sleep(JOB_HEARTBEAT)
+        with _active_lock:
+            job_ids = list(_active)
+        if job_ids:
+            with _connect() as conn:
+                conn.execute(f'UPDATE jobs SET updated = ? WHERE id IN ({", ".join("?" * len(job_ids))})', (time.time(), *job_ids))
+
+
+def _start_heartbeat():
+    global _heartbeat
+    with _active_lock:
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_renew_leases, daemon=True, name='job-heartbeat')
+            _heartbeat.start()
+
+
+def _update(job_id, **values):
+    values['updated'] = time.time()
+    columns = ', '.join(f'{key} = ?' for key in values)
+    with _connect() as conn:
+        conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*values.values(), job_id))
+
+
+###################################
+## Handle passed to the job function to report progress
+
+class Job:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.cancellable = True
+
+    def cancel_requested(self):
+        with _connect() as conn:
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (self.id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def check_cancel(self, stage=None):
+        # Called between stages and inside long stages, this is where a cancelled job stops
+        if self.cancellable and self.cancel_requested():
+            raise JobCancelled(f'Cancelled before stage "{stage}"' if stage else 'Cancelled')
+
+    def report(self, stage, progress, message='', cancellable=True):
+        # cancellable=False: from this stage on the job can't be cancelled anymore (e.g. the data
+        # has been sent), a cancel is still checked before the stage starts
+        self.check_cancel(stage)
+        self.cancellable = self.cancellable and cancellable
+        _update(self.id, stage=stage, progress=progress, message=message, cancellable=int(self.cancellable))
+
+    def partial_result(self, result):
+        # Intermediate result shown while the job is running (e.g. the streamed description)
+        _update(self.id, result=str(result))
+
+
+def _run(job_id, fn, args, kwargs):
+    job = Job(job_id)
+    try:
+        if job.cancel_requested():
+            raise JobCancelled('Cancelled before start')
+        _update(job_id, status=RUNNING)
+        result = fn(job, *args, **kwargs)
+        _update(job_id, status=DONE, progress=1.0, result=str(result))
+    except JobCancelled as e:
+        _update(job_id, status=CANCELLED, message=str(e))
+    except Exception as e:
+        _update(job_id, status=FAILED, error=f'{e}\n{traceback.format_exc()}', message=str(e))
+    finally:
+        with _active_lock:
+            _active.discard(job_id)
+
+
+###################################
+## Public functions
+
+def submit_job(fn, *args, kind='job', **kwargs):
+    # fn is called as fn(job, *args, **kwargs) in a background thread
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _connect() as conn:
+        conn.execute('DELETE FROM jobs WHERE updated < ? AND status IN (?, ?, ?)', (now - JOB_MAX_AGE, *FINISHED_STATES))
+        conn.execute('INSERT INTO jobs (id, kind, status, stage, progress, message, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                     (job_id, kind, QUEUED, 'queued', 0.0, 'Waiting for a free worker', now, now))
+    with _active_lock:
+        _active.add(job_id)
+    _start_heartbeat()
+    _executor(kind).submit(_run, job_id, fn, args, kwargs)
+    return job_id
+
+
+def get_job(job_id):
+    with _connect() as conn:
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    if row is None:
+        raise KeyError(f'Job {job_id} does not exist')
+    return dict(row)
+
+
+def cancel_job(job_id):
+    with _connect() as conn:
+        conn.execute('UPDATE jobs SET cancel_requested = 1, updated = ? WHERE id = ?', (time.time(), job_id))
+    return get_job(job_id)
+
+
+_init_db()
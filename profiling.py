@@ -0,0 +1,123 @@
+import os
+import math
+import datetime
+import numpy as np
+import pandas as pd
+from feature_cache import hash_column, column_digest
+from duplicate_index import minhash_signature, encode_signature
+
+
+###################################
+## Column profile computed once at ingest
+# Every column is scanned once for its null count, approximate number of distinct values
+# (HyperLogLog on the value hashes), min/max, most frequent values and a random sample.
+# The profile is stored with the dataset and reused by the description prompt, the feature
+# type inference (the value hashes are the cache fingerprint), the NOMINAL values and the
+# duplicate check (MinHash of the value hashes) at publish.
+
+TOP_K = int(os.environ.get('PROFILE_TOP_K', 10))
+SAMPLE_SIZE = int(os.environ.get('PROFILE_SAMPLE_SIZE', 20))
+EXACT_DISTINCT = int(os.environ.get('PROFILE_EXACT_DISTINCT', 100000)) # below this estimate the values are counted exactly
+MAX_VALUES = int(os.environ.get('PROFILE_MAX_VALUES', 1000)) # distinct values stored for NOMINAL attributes
+HLL_PRECISION = 14 # 2**14 registers, about 1% standard error
+
+
+def _plain(value):
+    # JSON compatible python value, the profile is stored in the metadata file of the dataset
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        return value if math.isfinite(value) else str(value)
+    if isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def approx_distinct(hashes, precision=HLL_PRECISION):
+    # HyperLogLog: the first bits of a hash choose a register, the register keeps the
+    # longest run of leading zeros seen in the remaining bits
+    if len(hashes) == 0:
+        return 0
+    m = 1 << precision
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    # frexp gives the bit length, exact because the remaining bits fit in a float mantissa
+    rank = (64 - precision) - np.frexp(rest.astype(np.float64))[1] + 1
+    registers = np.zeros(m)
+    longest = pd.Series(rank).groupby(index).max()
+    registers[longest.index.to_numpy()] = longest.to_numpy()
+
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.power(2.0, -registers))
+    zeros = m - len(longest)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros) # linear counting for small cardinalities
+    return int(round(estimate))
+
+
+def reservoir_sample(column, k=SAMPLE_SIZE, seed=0):
+    # Every value gets a random priority and the k smallest are kept. This is the same uniform
+    # sample a reservoir gives, without a python loop over the rows.
+    if len(column) <= k:
+        return column
+    priority = np.random.default_rng(seed).random(len(column))
+    return column.iloc[np.sort(np.argpartition(priority, k)[:k])]
+
+
+def _min_max(column):
+    try:
+        return _plain(column.min()), _plain(column.max())
+    except (TypeError, ValueError):
+        return None, None # unordered categoricals, mixed python objects
+
+
+def _value_counts(values):
+    try:
+        return values.value_counts(sort=True)
+    except TypeError:
+        return values.astype(str).value_counts(sort=True) # unhashable values (lists, dicts)
+
+
+def profile_column(column, top_k=TOP_K, sample_size=SAMPLE_SIZE, exact_distinct=EXACT_DISTINCT, max_values=MAX_VALUES):
+    hashes = hash_column(column)
+    present = column.notna().to_numpy()
+    values = column[present]
+    distinct = approx_distinct(hashes[present])
+    minimum, maximum = _min_max(values)
+    sample = reservoir_sample(values, sample_size)
+
+    exact = distinct <= exact_distinct
+    if exact:
+        counts = _value_counts(values)
+        counts = counts[counts > 0] # categories that don't occur
+        distinct = len(counts)
+    else:
+        # Too many values to count them all, the most frequent values of the sample are shown
+        counts = _value_counts(sample)
+
+    return {
+        'column': str(column.name),
+        'dtype': str(column.dtype),
+        'count': int(present.sum()),
+        'nulls': int(len(column) - present.sum()),
+        'distinct': int(distinct),
+        'exact': bool(exact),
+        'min': minimum,
+        'max': maximum,
+        'top': [[_plain(value), int(count)] for value, count in counts.head(top_k).items()],
+        # Distinct values as strings, the same as functions.nominal_values gives
+        'values': counts.index.astype(str).tolist() if exact and distinct <= max_values else None,
+        'sample': [_plain(value) for value in sample.tolist()],
+        'digest': column_digest(hashes),
+        'minhash': encode_signature(minhash_signature(hashes[present])),
+    }
+
+
+def profile_dataset(df, **kwargs):
+    # {column name: profile}, in the order of the columns
+    return {str(col): profile_column(df.iloc[:, nr], **kwargs) for nr, col in enumerate(df.columns)}
@@ -0,0 +1,134 @@
+import os
+import re
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functions import chat_api
+
+
+###################################
+## Prompt with sample values of every column, within a token budget
+# The samples come from the column profile that is computed at upload (profiling.py). Long values
+# are cut, columns that only differ by a number in their name (pixel1 .. pixel784) and have the
+# same dtype are one line, and the number of values per column goes down until the prompt fits
+# PROMPT_TOKEN_BUDGET. Tables that are still too wide are split into chunks: every chunk is
+# summarized by its own chat_api call (concurrently, the map step) and the description is
+# written from the summaries (the reduce step).
+# Tokens are estimated from the characters, the GPT tokenizers average about 4 per token.
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 4000)) # tokens per request
+PROMPT_VALUE_CHARS = int(os.environ.get('PROMPT_VALUE_CHARS', 60)) # longer sample values are cut
+PROMPT_GROUP_MIN = int(os.environ.get('PROMPT_GROUP_MIN', 3)) # similar columns that become one line
+PROMPT_MAX_CHUNKS = int(os.environ.get('PROMPT_MAX_CHUNKS', 16))
+PROMPT_MAP_WORKERS = int(os.environ.get('PROMPT_MAP_WORKERS', 4)) # concurrent requests of the map step
+VALUES_PER_COLUMN = (5, 3, 1)
+CHARS_PER_TOKEN = 4
+
+# Persona of the map step, the persona of the description is in functions.py
+map_persona = """You are helping to describe a dataset that has too many columns for one request.
+    Below are some of its columns with sample values. Summarize in at most 80 words, using only
+    ASCII characters, what these columns contain and what they could be used for.
+
+    """
+
+logger = logging.getLogger(__name__)
+
+
+def count_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_value(value, max_chars=PROMPT_VALUE_CHARS):
+    # Long strings are cut, floats keep 6 significant digits
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + '...'
+    if isinstance(value, float):
+        return float(f'{value:.6g}')
+    return value
+
+
+def column_groups(profile, min_size=PROMPT_GROUP_MIN):
+    # [(names, profiles)] in column order, similar columns are grouped
+    groups = {}
+    for col, column_profile in profile.items():
+        key = (re.sub(r'\d+', '#', col), column_profile['dtype'])
+        groups.setdefault(key, []).append((col, column_profile))
+    result = []
+    for members in groups.values():
+        if len(members) >= min_size:
+            result.append(([col for col, _ in members], [column_profile for _, column_profile in members]))
+        else:
+            result.extend(([col], [column_profile]) for col, column_profile in members)
+    position = {col: nr for nr, col in enumerate(profile)}
+    return sorted(result, key=lambda group: position[group[0][0]])
+
+
+def group_line(names, profiles, n_values, max_chars=PROMPT_VALUE_CHARS):
+    if len(names) == 1:
+        values = profiles[0]['sample'][:n_values]
+        return f"{names[0]}: {[truncate_value(value, max_chars) for value in values]}"
+    # Values of the first columns of the group
+    values = [value for column_profile in profiles for value in column_profile['sample'][:1]][:n_values]
+    return f"{names[0]} .. {names[-1]} ({len(names)} columns, {profiles[0]['dtype']}): {[truncate_value(value, max_chars) for value in values]}"
+
+
+def _header(filename):
+    return f"Dataset name: {filename}, Columns : "
+
+
+def _chunks(header, lines, budget):
+    # Consecutive lines, as many as fit the budget next to the header
+    chunks, current, tokens = [], [], count_tokens(header)
+    for line in lines:
+        line_tokens = count_tokens(line) + 1
+        if current and tokens + line_tokens > budget:
+            chunks.append(current)
+            current, tokens = [], count_tokens(header)
+        current.append(line)
+        tokens += line_tokens
+    if current:
+        chunks.append(current)
+    return [header + ", ".join(chunk) for chunk in chunks]
+
+
+def build_prompts(filename, profile, budget=PROMPT_TOKEN_BUDGET, max_chunks=PROMPT_MAX_CHUNKS):
+    # One prompt when the columns fit the budget, otherwise the chunks for the map step
+    groups = column_groups(profile)
+    header = _header(filename)
+    prompts = None
+    for n_values in VALUES_PER_COLUMN:
+        lines = [group_line(names, profiles, n_values) for names, profiles in groups]
+        prompts = _chunks(header, lines, budget)
+        if len(prompts) == 1:
+            return prompts
+    # Too wide for one request: the most values per column that stay within max_chunks
+    for n_values in VALUES_PER_COLUMN:
+        lines = [group_line(names, profiles, n_values) for names, profiles in groups]
+        chunked = _chunks(header, lines, budget)
+        if len(chunked) <= max_chunks:
+            return chunked
+    return prompts
+
+
+def _summarize(prompt, timeout):
+    start = time.perf_counter()
+    summary = chat_api(prompt, timeout=timeout, persona=map_persona)
+    return summary, {'tokens': count_tokens(map_persona + prompt), 'seconds': time.perf_counter() - start}
+
+
+def description_prompt(filename, prompts, budget=PROMPT_TOKEN_BUDGET, timeout=None, workers=PROMPT_MAP_WORKERS):
+    # The prompt for the description and the tokens and latency of every map request.
+    # A single prompt is used as it is, chunks are summarized first.
+    if len(prompts) == 1:
+        return prompts[0], []
+    with ThreadPoolExecutor(max_workers=min(workers, len(prompts))) as pool:
+        results = list(pool.map(lambda prompt: _summarize(prompt, timeout), prompts))
+    for nr, (_, request) in enumerate(results):
+        logger.info("Map request %d/%d: %d tokens, %.2fs", nr + 1, len(prompts), request['tokens'], request['seconds'])
+
+    header = f"Dataset name: {filename}, Column summaries (the columns were described in {len(prompts)} parts): "
+    # Every summary gets the same share of the budget
+    max_chars = max(1, (budget - count_tokens(header)) * CHARS_PER_TOKEN // len(results) - len(f"Part {len(results)}: ...") - 1)
+    summaries = [truncate_value(summary.strip(), max_chars) for summary, _ in results]
+    prompt = header + " ".join(f"Part {nr + 1}: {summary}" for nr, summary in enumerate(summaries))
+    return prompt, [request for _, request in results]
@@ -0,0 +1,45 @@
+import os
+import argparse
+from gunicorn.app.base import BaseApplication
+
+
+###################################
+## Production launcher
+# Runs wsgi:server in gunicorn with several worker processes, so a long sortinghat inference
+# or upload of one user doesn't block the others. The app is loaded (and warmed up) before the
+# workers are forked. Linux and macOS only, like gunicorn.
+# Usage: python serve.py --workers 4 --threads 4 --bind 0.0.0.0:8050
+
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+
+
+class UploaderApplication(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from wsgi import server
+        return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the uploader with several worker processes')
+    parser.add_argument('--bind', default=os.environ.get('BIND', '0.0.0.0:8050'))
+    parser.add_argument('--workers', type=int, default=WEB_CONCURRENCY, help='worker processes (default: $WEB_CONCURRENCY or the number of CPUs)')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker, for the polling and upload requests')
+    parser.add_argument('--timeout', type=int, default=300, help='seconds before a stuck worker is restarted')
+    args = parser.parse_args()
+
+    UploaderApplication({
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'timeout': args.timeout,
+        'preload_app': True, # load the model once in the master process
+        'worker_class': 'gthread',
+    }).run()
@@ -0,0 +1,209 @@
+import os
+import time
+import uuid
+import logging
+from io import BytesIO
+import numpy as np
+import pandas as pd
+import arff
+import requests
+import xmltodict
+from packaging.version import Version
+from validation import check_column
+
+
+###################################
+## Publish from a file on disk instead of an ARFF string in memory
+# create_dataset turns the whole DataFrame into one object array and one ARFF string and decodes
+# it again to check it, and requests reads the whole file into memory again to build the request.
+# Here the ARFF rows are written to a temporary file in chunks (the header comes from
+# create_dataset on the first row, so it is the same as before) and the upload is a multipart
+# body that is read from that file while it is sent. Memory stays at one chunk, whatever the
+# size of the dataset. The values of NOMINAL and numeric attributes are checked per chunk
+# (validation.check_column), create_dataset raised these errors for the whole dataset.
+
+PUBLISH_CHUNK_ROWS = int(os.environ.get('PUBLISH_CHUNK_ROWS', 10000))
+PUBLISH_TMP_DIR = os.environ.get('PUBLISH_TMP_DIR') # default is the system temp directory
+
+
+def dataframe_chunks(df, chunk_rows=PUBLISH_CHUNK_ROWS):
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def arff_header(arff_text):
+    # Everything up to and including @DATA
+    end = arff_text.index('\n@DATA') + len('\n@DATA')
+    return arff_text[:end] + '\n'
+
+
+def _encode_column(column, arff_type):
+    # ARFF text of every value, like liac-arff: None, NaN and '' are missing ('?')
+    if pd.api.types.is_numeric_dtype(column.dtype) and not isinstance(column.dtype, pd.CategoricalDtype):
+        if str(arff_type).upper() == 'INTEGER' and pd.api.types.is_float_dtype(column.dtype):
+            # Integers with missing values are read as floats, they are written without '.0'
+            column = column.astype('Int64')
+        elif pd.api.types.is_float_dtype(column.dtype):
+            # float32 columns hold float64 values exactly (ingest.optimize_dtypes), they are written as those
+            column = column.astype('float64')
+        text = column.astype(str).to_numpy(dtype=object)
+        text[column.isna().to_numpy()] = '?'
+        return text
+    # Every distinct value is encoded once, code -1 (missing) takes the last entry
+    codes, uniques = pd.factorize(column)
+    encoded = [arff.encode_string(str(value)) if str(value) != '' else '?' for value in uniques]
+    return np.array(encoded + ['?'], dtype=object)[codes]
+
+
+def _check_chunk(df, attributes, offset):
+    # The checks of validation.py, for data that was not validated before (e.g. the batch upload)
+    for nr, (name, arff_type) in enumerate(attributes):
+        problem = check_column(df.iloc[:, nr], arff_type)
+        if problem:
+            raise ValueError(f"The arguments you have provided do not construct a valid ARFF file: {name}: {problem} in the rows from row {offset}")
+
+
+def write_arff(path, header, attributes, chunks, check_cancel=None):
+    # Writes the header and the rows of every chunk, returns the number of bytes written.
+    # check_cancel is called before every chunk, it raises to stop the serialization (jobs.Job.check_cancel)
+    rows = 0
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(header)
+        for chunk in chunks:
+            if check_cancel is not None:
+                check_cancel()
+            if len(chunk.columns) != len(attributes):
+                raise ValueError(f"The data has {len(chunk.columns)} columns, the attributes {len(attributes)}")
+            _check_chunk(chunk, attributes, rows)
+            columns = [_encode_column(chunk.iloc[:, nr], arff_type) for nr, (_, arff_type) in enumerate(attributes)]
+            f.writelines(','.join(row) + '\n' for row in zip(*columns))
+            rows += len(chunk)
+        return f.tell()
+
+
+class MultipartBody:
+    # multipart/form-data body with a known length, the files are read while the request is sent.
+    # fields are {name: value}, files are {name: (filename, bytes or path of the file)}.
+    def __init__(self, fields, files):
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._parts = []
+        for name, value in fields.items():
+            self._parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+        for name, (filename, content) in files.items():
+            self._parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                               f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8'))
+            self._parts.append(content) # bytes, or the path of a file
+            self._parts.append(b'\r\n')
+        self._parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+        # requests sets the Content-Length from len, so the body is not sent chunked
+        self.len = sum(len(part) if isinstance(part, bytes) else os.path.getsize(part) for part in self._parts)
+        self._next = 0
+        self._current = None
+
+    def _open_next(self):
+        part = self._parts[self._next]
+        self._next += 1
+        if isinstance(part, bytes):
+            return BytesIO(part)
+        return open(part, 'rb')
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.len
+        blocks, length = [], 0
+        while length < size:
+            if self._current is None:
+                if self._next == len(self._parts):
+                    break
+                self._current = self._open_next()
+            block = self._current.read(size - length)
+            if not block:
+                self._current.close()
+                self._current = None
+                continue
+            blocks.append(block)
+            length += len(block)
+        return b''.join(blocks)
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+###################################
+## Adapter for the openml internals
+# The streaming publish needs parts of openml that are not public API: the ARFF text of
+# create_dataset (OpenMLDataset._dataset), the description XML (_to_xml), the parsing of the
+# answer of the server (_parse_publish_response) and the retry and error conventions of its
+# HTTP client. They are all used through OpenMLAdapter, which only enables the streaming publish
+# for the openml versions it was checked against (SUPPORTED_OPENML). For other versions
+# functions.publish falls back to create_dataset(...).publish() with the whole dataset in memory.
+
+SUPPORTED_OPENML = ('0.14', '0.16') # >= first, < second: the pinned 0.14.2 and 0.15
+_PRIVATE_METHODS = ('_to_xml', '_parse_publish_response')
+
+logger = logging.getLogger(__name__)
+
+
+class OpenMLAdapter:
+    def __init__(self, oml):
+        self.oml = oml
+        self.version = oml.__version__
+        low, high = (Version(version) for version in SUPPORTED_OPENML)
+        missing = [name for name in _PRIVATE_METHODS if not hasattr(oml.datasets.OpenMLDataset, name)]
+        self.supported = low <= Version(self.version) < high and not missing
+        if not self.supported:
+            logger.warning("openml %s is not supported by the streaming publish (supported: >=%s,<%s%s), datasets are published in memory",
+                           self.version, *SUPPORTED_OPENML, f", missing {', '.join(missing)}" if missing else '')
+
+    def arff_header(self, my_data):
+        # Header of the ARFF text create_dataset has built
+        return arff_header(my_data._dataset)
+
+    def release_data(self, my_data):
+        # The rows come from the file, the ARFF text of create_dataset is not needed anymore
+        my_data._dataset = None
+
+    def server_exception(self, response, url):
+        # The error of the OpenML answer, like the openml client raises it
+        try:
+            error = xmltodict.parse(response.text)['oml:error']
+        except Exception:
+            return self.oml.exceptions.OpenMLServerError(f"Unexpected server error when calling {url}.\nStatus code: {response.status_code}\n{response.text}")
+        message = error['oml:message']
+        if error.get('oml:additional_information'):
+            message += f" - {error['oml:additional_information']}"
+        return self.oml.exceptions.OpenMLServerException(message=message, code=int(error['oml:code']), url=url)
+
+    def post_dataset(self, description_xml, arff_path, api_key):
+        # POST data/ with the description and the ARFF file, returns the answer of the server.
+        # Database errors (107) and connection errors are retried config.connection_n_retries times,
+        # every try sends a new body from the file.
+        url = self.oml.config.server.rstrip('/') + '/data/'
+        n_retries = max(1, self.oml.config.connection_n_retries)
+        headers = {'user-agent': f'openml-python/{self.version}'}
+        for attempt in range(1, n_retries + 1):
+            body = MultipartBody({'api_key': api_key}, {'description': ('description.xml', description_xml.encode('utf-8')),
+                                                        'dataset': ('dataset.arff', arff_path)})
+            try:
+                response = requests.post(url, data=body, headers=dict(headers, **{'Content-Type': body.content_type}))
+                if response.status_code == 200:
+                    return response.text
+                error = self.server_exception(response, url)
+                if getattr(error, 'code', None) != 107:
+                    raise error
+            except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError, requests.exceptions.SSLError) as e:
+                error = e
+            finally:
+                body.close()
+            if attempt == n_retries:
+                raise error
+            time.sleep(min(2 ** (attempt - 1), 60))
+
+    def upload_dataset(self, my_data, arff_path, api_key):
+        # Publishes the description of my_data with the ARFF file, my_data gets the id of the dataset
+        response = self.post_dataset(my_data._to_xml(), arff_path, api_key)
+        my_data._parse_publish_response(xmltodict.parse(response))
+        return my_data
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset_store
+
+
+###################################
+## Sorted copies of the stored datasets (the preview sorted by a column)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_store, 'STORE_DIR', str(tmp_path))
+    monkeypatch.setattr(dataset_store, 'ROW_GROUP_ROWS', 10000)
+    return tmp_path
+
+
+def many_categories(rows, categories, seed=0):
+    rng = np.random.default_rng(seed)
+    names = np.array([f'category {nr}' for nr in range(categories)])
+    return pd.DataFrame({
+        'value': rng.random(rows),
+        'category': pd.Categorical(names[rng.integers(0, categories, rows)]),
+    })
+
+
+@pytest.mark.parametrize('sort_by', ['value', 'category'])
+def test_sorted_rows_with_many_categories(store, sort_by):
+    df = many_categories(60000, 20000)
+    token = dataset_store.save_dataset(df)
+    assert pq.ParquetFile(dataset_store.dataset_path(token)).num_row_groups == 6
+
+    start = time.perf_counter()
+    rows = dataset_store.read_rows(token, 0, len(df), sort_by=sort_by, ascending=False)
+    assert time.perf_counter() - start < 30
+
+    expected = df.assign(category=df['category'].astype(str)).sort_values(sort_by, ascending=False, kind='stable')
+    assert rows['value'].tolist() == expected['value'].tolist()
+    assert rows['category'].astype(str).tolist() == expected['category'].tolist()
+    assert set(rows['category'].cat.categories) == set(df['category'].cat.categories)
+
+
+def test_sorted_copy_merges_the_dictionaries_of_the_row_groups(tmp_path):
+    # Every row group has its own dictionary, with categories that the others don't have
+    path, sorted_path = str(tmp_path / 'data.parquet'), str(tmp_path / 'sorted.parquet')
+    groups = [many_categories(5000, 3000, seed).assign(category=lambda df, seed=seed: df['category'].astype(str) + f' of {seed}')
+              for seed in range(4)]
+    schema = pa.schema([('value', pa.float64()), ('category', pa.dictionary(pa.int32(), pa.string()))])
+    with pq.ParquetWriter(path, schema) as writer:
+        for group in groups:
+            writer.write_table(pa.Table.from_pandas(group, schema=schema, preserve_index=False))
+
+    dataset_store._write_sorted(path, sorted_path, 'category', True)
+    rows = pq.read_table(sorted_path).to_pandas()
+    expected = pd.concat(groups).sort_values('category', kind='stable')
+    assert rows['category'].astype(str).tolist() == expected['category'].tolist()
+    assert rows['value'].tolist() == expected['value'].tolist()
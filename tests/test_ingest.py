@@ -0,0 +1,76 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ingest
+import functions
+
+
+###################################
+## ARFF reader
+
+ARFF_WITH_DATES = '''@RELATION dates
+@ATTRIBUTE day DATE "dd-MM-yyyy"
+@ATTRIBUTE time DATE "yyyy-MM-dd'T'HH:mm:ssXXX"
+@ATTRIBUTE iso DATE
+@DATA
+01-02-2020,2020-01-02T03:04:05+02:00,2020-01-02
+13-01-2020,?,2020-01-02T10:30:00
+25-12-2020,2020-06-30T23:00:00Z,?
+'''
+
+
+def write(tmp_path, name, text):
+    path = str(tmp_path / name)
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+
+def test_arff_dates_are_parsed_with_their_declared_format(tmp_path):
+    df, declared_types = ingest.read_arff(write(tmp_path, 'dates.arff', ARFF_WITH_DATES))
+    assert df['day'].tolist() == [pd.Timestamp('2020-02-01'), pd.Timestamp('2020-01-13'), pd.Timestamp('2020-12-25')]
+    assert df['time'].tolist()[::2] == [pd.Timestamp('2020-01-02 01:04:05'), pd.Timestamp('2020-06-30 23:00:00')] # UTC
+    assert df['iso'].tolist()[:2] == [pd.Timestamp('2020-01-02'), pd.Timestamp('2020-01-02 10:30:00')]
+    assert df[['time', 'iso']].isna().sum().tolist() == [1, 1]
+    assert declared_types == {'day': 'datetime', 'time': 'datetime', 'iso': 'datetime'}
+
+
+def test_arff_dates_that_do_not_match_the_format_are_an_error(tmp_path):
+    text = ARFF_WITH_DATES.replace('25-12-2020', '2020-12-25')
+    with pytest.raises(ValueError, match="'2020-12-25' of attribute day on line 8 does not match its date format dd-MM-yyyy"):
+        ingest.read_arff(write(tmp_path, 'dates.arff', text))
+
+
+###################################
+## CSV reader
+
+CSV_WITH_EMPTY_FIELDS = '''number,value,category,text
+1,0.5,a b,x
+2,,"c,d",
+3,1.5,,"it's"
+4,NA,a b,None
+5,2.5,,null
+6,3.5,"c,d",""
+'''
+
+
+def as_objects(df):
+    # Missing values as None, whatever type the reader gave the column
+    return df.astype(object).where(df.notna(), None)
+
+
+def test_csv_empty_fields_are_missing_like_pandas(tmp_path):
+    path = write(tmp_path, 'empty.csv', CSV_WITH_EMPTY_FIELDS)
+
+    expected = pd.read_csv(path)
+    df = ingest.read_csv(path, engine='pyarrow')
+    pd.testing.assert_frame_equal(as_objects(df), as_objects(expected), check_dtype=False)
+    assert df.isna().sum().tolist() == expected.isna().sum().tolist() == [0, 2, 2, 4]
+
+    # Missing values are not a nominal value of their own
+    df, _ = ingest.optimize_dtypes(ingest.read_dataset(path, 'empty.csv')[0])
+    attributes, _ = functions.build_attributes(df, [{'FeatureName': 'category', 'FeatureTypePublish': 'categorical'}])
+    assert sorted(attributes[0][1]) == ['a b', 'c,d']
@@ -0,0 +1,117 @@
+import os
+import sys
+import types
+import threading
+import arff
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import functions
+from validation import validate_publish
+from fake_openml_server import create_app
+from streaming_publish import OpenMLAdapter, dataframe_chunks
+
+
+###################################
+## Publish against the local OpenML stand-in (fake_openml_server.py)
+# The streaming path (chunks -> ARFF file -> multipart upload) and the fallback to
+# create_dataset(...).publish() for unsupported openml versions run for real, over HTTP.
+
+ATTRIBUTES = [('number', 'INTEGER'), ('value', 'REAL'), ('category', ['blue', 'green', 'red']), ('text', 'STRING')]
+
+
+def make_dataset(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    number = rng.integers(0, 1000, rows).astype(float)
+    number[::7] = np.nan
+    return pd.DataFrame({
+        'number': number,
+        'value': rng.random(rows).astype(np.float32),
+        'category': pd.Categorical(rng.choice(['red', 'green', 'blue'], rows)),
+        'text': [f"row {i}, 'quoted'" if i % 5 else None for i in range(rows)],
+    })
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    store_dir = str(tmp_path_factory.mktemp('uploads'))
+    server = make_server('127.0.0.1', 0, create_app(store_dir=store_dir), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    oml = functions.openml_module()
+    previous = oml.config.server
+    oml.config.server = f'http://127.0.0.1:{server.server_port}/api/v1/xml'
+    yield types.SimpleNamespace(url=f'http://127.0.0.1:{server.server_port}', store_dir=store_dir)
+    oml.config.server = previous
+    server.shutdown()
+
+
+def publish(data, name):
+    return functions.publish(data=data, name=name, description='Test dataset', license='Public Domain (CC0)',
+                             creator='test', contributor='test', collection_date='01-01-2024', language='English',
+                             attributes=ATTRIBUTES, default_target_attribute='category', ignore_attribute=None,
+                             citation='', row_id=None, api='test-key')
+
+
+def uploaded(server, message):
+    # The ARFF file the server received for the published dataset
+    dataset_id = int(functions.published_url(message).rstrip('/').split('/')[-1])
+    with open(os.path.join(server.store_dir, f'{dataset_id}_dataset.arff')) as f:
+        return dataset_id, f.read()
+
+
+def expected_arff(df):
+    # The ARFF text of create_dataset for the whole dataset, what openml itself would upload
+    oml = functions.openml_module()
+    return oml.datasets.functions.create_dataset(
+        name='expected', description='Test dataset', licence='Public Domain (CC0)', data=functions.arff_compatible(df),
+        creator='test', contributor='test', collection_date='01-01-2024', language='English', attributes=ATTRIBUTES,
+        default_target_attribute='category', ignore_attribute=None, citation='', row_id_attribute=None)._dataset
+
+
+def test_streaming_publish_uploads_the_arff_of_create_dataset(server):
+    assert functions.openml_adapter().supported
+    df = make_dataset(2500)
+    message = publish(dataframe_chunks(df, 1000), 'streamed')
+    assert functions.published_url(message), message
+
+    dataset_id, text = uploaded(server, message)
+    expected = arff.loads(expected_arff(df))
+    received = arff.loads(text)
+    assert received['attributes'] == expected['attributes']
+    assert received['data'] == expected['data']
+    info = {upload['id']: upload for upload in requests.get(f'{server.url}/uploads').json()}[dataset_id]
+    assert (info['rows'], info['columns']) == (2500, 4)
+
+
+def test_streaming_publish_reports_server_errors(server):
+    message = functions.publish(data=make_dataset(10), name='no_key', description='Test dataset', license='Public Domain (CC0)',
+                                creator='test', contributor='test', collection_date='01-01-2024', language='English',
+                                attributes=ATTRIBUTES, default_target_attribute='category', ignore_attribute=None,
+                                citation='', row_id=None, api='')
+    assert message.startswith('An error occurred') and 'Authentication failed' in message
+
+
+def test_unsupported_openml_falls_back_to_create_dataset(server, monkeypatch):
+    oml = functions.openml_module()
+    old_openml = types.SimpleNamespace(__version__='0.13.1', datasets=oml.datasets, config=oml.config, exceptions=oml.exceptions)
+    adapter = OpenMLAdapter(old_openml)
+    assert not adapter.supported
+    monkeypatch.setattr(functions, 'openml_adapter', lambda: adapter)
+
+    df = make_dataset(300)
+    message = publish(dataframe_chunks(df, 100), 'in_memory')
+    assert functions.published_url(message), message
+    _, text = uploaded(server, message)
+    assert arff.loads(text)['data'] == arff.loads(expected_arff(df))['data']
+
+
+@pytest.mark.parametrize('chunks', [lambda df: df, lambda df: dataframe_chunks(df), lambda df: iter([])])
+def test_empty_dataset_is_rejected(server, chunks):
+    df = make_dataset(0)
+    assert validate_publish(df, ATTRIBUTES) == [(None, 'the dataset has no rows')]
+    with pytest.raises(ValueError, match='The dataset is empty'):
+        publish(chunks(df), 'empty')
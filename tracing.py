@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from flask import Response
+
+
+###################################
+## Timing of the upload stages
+# A trace covers one callback (or background job), its spans are the stages inside it. Every
+# span records wall time, how far the resident memory grew above its start (sampled by a
+# background thread) and optionally the size of the data it handled and the tokens it sent to
+# the chat API.
+# Finished traces are added to Prometheus histograms in a SQLite file, so /metrics shows the
+# numbers of all server workers. With TRACE_LOG every trace is also written as one JSON line.
+
+METRICS_DB_PATH = os.environ.get('METRICS_DB_PATH', os.path.join(tempfile.gettempdir(), 'openml_uploader_metrics.sqlite'))
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') not in ('0', 'false', 'False', '')
+TRACE_LOG = os.environ.get('TRACE_LOG') # file for the JSON lines, '-' for stderr
+MEMORY_SAMPLE_INTERVAL = float(os.environ.get('TRACE_MEMORY_INTERVAL', 0.05)) # seconds
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(13)) # 1KB to 16GB
+TOKEN_BUCKETS = tuple(250 * 2 ** i for i in range(10)) # 250 to 128k tokens
+# metric name: (help text, buckets, key of the span)
+METRICS = {
+    'uploader_stage_seconds': ('Wall time of an upload stage', SECONDS_BUCKETS, 'seconds'),
+    'uploader_stage_peak_memory_bytes': ('Growth of the resident memory during an upload stage', BYTES_BUCKETS, 'peak_memory_bytes'),
+    'uploader_stage_payload_bytes': ('Size of the data handled by an upload stage', BYTES_BUCKETS, 'payload_bytes'),
+    'uploader_stage_prompt_tokens': ('Estimated prompt tokens sent to the chat API by an upload stage', TOKEN_BUCKETS, 'prompt_tokens'),
+}
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+###################################
+## Resident memory, sampled while spans are open
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+_open_spans = []
+_spans_lock = threading.Lock()
+_spans_open = threading.Event() # set while there are open spans, the sampler sleeps otherwise
+_sampler = None
+
+
+def _rss():
+    # Linux only, memory is not recorded elsewhere
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _sample_memory():
+    while True:
+        _spans_open.wait()
+        time.sleep(MEMORY_SAMPLE_INTERVAL)
+        with _spans_lock:
+            if not _open_spans:
+                continue
+            rss = _rss()
+            for record in _open_spans:
+                record['_peak'] = max(record['_peak'], rss)
+
+
+def _start_sampler():
+    global _sampler
+    with _spans_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_memory, daemon=True, name='trace-memory')
+            _sampler.start()
+
+
+###################################
+## Spans and traces
+
+@contextmanager
+def span(stage, payload_bytes=None):
+    # The yielded dict can get 'payload_bytes' or 'prompt_tokens' when they are only known at the end.
+    # Outside of a trace nothing is recorded.
+    current = getattr(_local, 'trace', None)
+    record = {'stage': stage}
+    if payload_bytes is not None:
+        record['payload_bytes'] = int(payload_bytes)
+    if current is None:
+        yield record
+        return
+
+    rss = _rss()
+    if rss is not None:
+        record['_peak'] = rss
+        _start_sampler()
+        with _spans_lock:
+            _open_spans.append(record)
+            _spans_open.set()
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        if rss is not None:
+            with _spans_lock:
+                _open_spans.remove(record)
+                if not _open_spans:
+                    _spans_open.clear()
+            record['peak_memory_bytes'] = max(record.pop('_peak'), _rss() or 0) - rss
+        current['spans'].append(record)
+
+
+@contextmanager
+def trace(callback):
+    previous = getattr(_local, 'trace', None)
+    current = {'callback': callback, 'started': time.time(), 'spans': []}
+    _local.trace = current
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current['error'] = type(e).__name__
+        raise
+    finally:
+        _local.trace = previous
+        current['seconds'] = time.perf_counter() - start
+        if current['spans']:
+            if METRICS_ENABLED:
+                _record(current)
+            if TRACE_LOG:
+                _log(current)
+
+
+def traced(callback):
+    # Decorator for callbacks and jobs, every call is one trace
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace(callback):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _log(current):
+    line = json.dumps(current, default=str)
+    with _log_lock:
+        if TRACE_LOG == '-':
+            print(line, file=sys.stderr, flush=True)
+        else:
+            with open(TRACE_LOG, 'a') as f:
+                f.write(line + '\n')
+
+
+###################################
+## Prometheus histograms
+
+def _connect():
+    conn = sqlite3.connect(METRICS_DB_PATH, timeout=30)
+    conn.execute("""CREATE TABLE IF NOT EXISTS histograms (
+        metric TEXT, callback TEXT, stage TEXT, bucket INTEGER, count INTEGER,
+        PRIMARY KEY (metric, callback, stage, bucket))""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS sums (
+        metric TEXT, callback TEXT, stage TEXT, total REAL, count INTEGER,
+        PRIMARY KEY (metric, callback, stage))""")
+    return conn
+
+
+def _bucket(buckets, value):
+    # Index of the first bucket that holds value, len(buckets) is +Inf
+    for nr, bound in enumerate(buckets):
+        if value <= bound:
+            return nr
+    return len(buckets)
+
+
+def _record(current):
+    rows, sums = [], []
+    for record in current['spans']:
+        for metric, (_, buckets, key) in METRICS.items():
+            value = record.get(key)
+            if value is None:
+                continue
+            labels = (metric, current['callback'], record['stage'])
+            rows.append(labels + (_bucket(buckets, value),))
+            sums.append(labels + (value,))
+    try:
+        with _connect() as conn:
+            conn.executemany("""INSERT INTO histograms (metric, callback, stage, bucket, count) VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT(metric, callback, stage, bucket) DO UPDATE SET count = count + 1""", rows)
+            conn.executemany("""INSERT INTO sums (metric, callback, stage, total, count) VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT(metric, callback, stage) DO UPDATE SET total = total + excluded.total, count = count + 1""", sums)
+    except sqlite3.Error:
+        pass # metrics must never break an upload
+
+
+def _format_bound(bound):
+    return '+Inf' if bound is None else repr(float(bound))
+
+
+def metrics_text():
+    # Prometheus text format of all histograms
+    with _connect() as conn:
+        counts = {}
+        for metric, callback, stage, bucket, count in conn.execute('SELECT metric, callback, stage, bucket, count FROM histograms'):
+            counts.setdefault((metric, callback, stage), {})[bucket] = count
+        sums = {(metric, callback, stage): (total, count)
+                for metric, callback, stage, total, count in conn.execute('SELECT metric, callback, stage, total, count FROM sums')}
+
+    lines = []
+    for metric, (help_text, buckets, _) in METRICS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for (name, callback, stage), total_count in sorted(sums.items()):
+            if name != metric:
+                continue
+            labels = f'callback="{callback}",stage="{stage}"'
+            cumulative = 0
+            for nr, bound in enumerate(buckets + (None,)):
+                cumulative += counts.get((name, callback, stage), {}).get(nr, 0)
+                lines.append(f'{metric}_bucket{{{labels},le="{_format_bound(bound)}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{{labels}}} {total_count[0]}')
+            lines.append(f'{metric}_count{{{labels}}} {total_count[1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def register_metrics_route(server):
+    @server.route('/metrics')
+    def metrics():
+        return Response(metrics_text(), mimetype='text/plain; version=0.0.4')
+
+
+def clear_metrics():
+    with _connect() as conn:
+        conn.execute('DELETE FROM histograms')
+        conn.execute('DELETE FROM sums')
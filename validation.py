@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+
+###################################
+## Checks of the attributes and the special columns before publishing
+# Everything OpenML (or the ARFF file) would reject is found locally, before anything is
+# serialized or sent: attributes that don't match the columns, names that are not ASCII,
+# target / ignore / row id attributes that don't exist, NOMINAL values that don't cover the
+# data, non-numeric values in numeric attributes and fractions in INTEGER attributes.
+# The checks are vectorized per column, the NOMINAL values come from the profile when it has them.
+
+NUMERIC_TYPES = ('NUMERIC', 'REAL', 'INTEGER')
+
+
+def expand_attribute(value):
+    # Target and ignore attributes are a name, a comma separated list or a list
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        return [name.strip() for name in value.split(',') if name.strip()]
+    return list(value)
+
+
+def _distinct(column):
+    # Codes of the values (-1 is missing) and the distinct values, text columns repeat their values
+    codes, uniques = pd.factorize(column)
+    return codes, pd.Series(uniques, dtype=object)
+
+
+def _first_invalid(column, invalid, problem):
+    row = int(np.flatnonzero(invalid)[0])
+    return f"value {column.iloc[row]!r} (row {row}) {problem}"
+
+
+def check_column(column, arff_type, column_profile=None):
+    # What is wrong with the values of the column for its ARFF type, None when they fit
+    present = column.notna().to_numpy()
+    if isinstance(arff_type, list):
+        if column_profile is not None and column_profile.get('exact') and column_profile.get('values') is not None:
+            if set(column_profile['values']) <= set(arff_type):
+                return None
+        codes, uniques = _distinct(column)
+        allowed = np.append(uniques.astype(str).isin(arff_type).to_numpy(), True)
+        invalid = ~allowed[codes]
+        if invalid.any():
+            return _first_invalid(column, invalid, f"is not one of the {len(arff_type)} NOMINAL values")
+        return None
+
+    if str(arff_type).upper() not in NUMERIC_TYPES:
+        return None
+    if pd.api.types.is_numeric_dtype(column.dtype) and not isinstance(column.dtype, pd.CategoricalDtype):
+        values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        codes, uniques = _distinct(column)
+        numbers = np.append(pd.to_numeric(uniques, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan), np.nan)
+        invalid = present & np.isnan(numbers[codes])
+        if invalid.any():
+            return _first_invalid(column, invalid, "is not a number")
+        values = numbers[codes]
+    invalid = np.isinf(values)
+    if invalid.any():
+        return _first_invalid(column, invalid, "is infinite")
+    if str(arff_type).upper() == 'INTEGER':
+        invalid = present & (values != np.floor(values))
+        if invalid.any():
+            return _first_invalid(column, invalid, "is not an integer")
+    return None
+
+
+def validate_publish(df, attributes, default_target_attribute=None, ignore_attribute=None, row_id_attribute=None, profile=None):
+    # attributes are the (name, ARFF type) pairs of build_attributes.
+    # Returns [(column, problem)], empty when the dataset can be published. column is None for
+    # problems of the whole dataset.
+    profile = profile or {}
+    errors = []
+    columns = [str(col) for col in df.columns]
+    names = [str(name) for name, _ in attributes]
+
+    if len(df) == 0:
+        errors.append((None, "the dataset has no rows"))
+    if names != columns:
+        if len(names) != len(columns):
+            errors.append((None, f"there are {len(names)} attributes for {len(columns)} columns"))
+        errors.extend((name, "is not a column of the dataset") for name in names if name not in columns)
+        errors.extend((col, "has no attribute") for col in columns if col not in names)
+        if not errors:
+            errors.append((None, "the attributes are not in the order of the columns"))
+    seen = set()
+    for name in names:
+        if name in seen:
+            errors.append((name, "is the name of more than one attribute"))
+        seen.add(name)
+        if not name.strip():
+            errors.append((name, "the name is empty"))
+        elif not name.isascii():
+            errors.append((name, "the name has non-ASCII characters"))
+
+    targets = expand_attribute(default_target_attribute)
+    ignored = expand_attribute(ignore_attribute)
+    row_ids = expand_attribute(row_id_attribute)
+    for field, values in (('target', targets), ('ignore attribute', ignored), ('row id attribute', row_ids)):
+        errors.extend((value, f"the {field} is not an attribute of the dataset") for value in values if value not in names)
+    if len(row_ids) > 1:
+        errors.append((None, "there can only be one row id attribute"))
+    errors.extend((name, "is the target and is ignored") for name in targets if name in ignored)
+    errors.extend((name, "is the target and the row id") for name in targets if name in row_ids)
+    for name in row_ids:
+        if name in columns and not df.iloc[:, columns.index(name)].is_unique:
+            errors.append((name, "the row id attribute has duplicate values"))
+
+    for name, arff_type in attributes:
+        name = str(name)
+        if name not in columns:
+            continue
+        if isinstance(arff_type, list) and not arff_type:
+            errors.append((name, "NOMINAL attribute without values"))
+            continue
+        problem = check_column(df.iloc[:, columns.index(name)], arff_type, profile.get(name))
+        if problem:
+            errors.append((name, problem))
+    return errors
+
+
+def error_message(errors):
+    return "; ".join(problem if column is None else f"{column}: {problem}" for column, problem in errors)
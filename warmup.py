@@ -0,0 +1,48 @@
+import os
+import time
+import logging
+import threading
+
+
+###################################
+## Loading of the heavy dependencies
+# sortinghatinf (model and NLTK data), the langdetect profiles, openml and openai are imported
+# on first use, so the server starts serving right away. The warm-up loads them in a background
+# thread once the server is up, so the first upload doesn't wait for them either.
+# Disable with WARMUP_ENABLED=0.
+
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', '1') not in ('0', 'false', 'False', '')
+WARMUP_DELAY = float(os.environ.get('WARMUP_DELAY', 1.0)) # seconds, lets the server bind its port first
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    # Returns the seconds every dependency took to load
+    from langdetect import detect
+    from feature_detection import sortinghat
+    from functions import openml_module
+
+    timings = {}
+    for name, load in (('sortinghat', sortinghat),
+                       ('langdetect', lambda: detect('Loading the language profiles of langdetect')),
+                       ('openml', openml_module),
+                       ('openai', lambda: __import__('openai'))):
+        start = time.perf_counter()
+        load()
+        timings[name] = time.perf_counter() - start
+    logger.info("Warm-up done: %s", ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return timings
+
+
+def start_warmup(delay=WARMUP_DELAY):
+    def run():
+        time.sleep(delay)
+        try:
+            warm_up()
+        except Exception:
+            logger.exception("Warm-up failed, the dependencies are loaded on first use")
+
+    thread = threading.Thread(target=run, daemon=True, name='warmup')
+    thread.start()
+    return thread
@@ -4,15 +4,24 @@ import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
 import dash_ag_grid as dag
 from datetime import datetime
-import base64
+import os
+import json
+import time
 import pandas as pd
-import io
 from dash.exceptions import PreventUpdate
 from langdetect import detect
-from functions import publish, chat_api
+from functions import publish, published_url, stream_chat_api, build_attributes, language_names, text_persona, MAX_NOMINAL_VALUES
+from prompts import build_prompts, description_prompt, count_tokens
 from feature_detection import return_predictions_of_features
-import arff
-import csv
+from dataset_store import save_dataset, load_dataset, load_metadata, dataset_path, dataset_schema, read_rows, iter_row_groups
+from ingest import file_kind, read_dataset, excel_sheets, optimize_dtypes
+from profiling import profile_dataset
+from validation import validate_publish, error_message
+from duplicate_index import INDEX_ENABLED as DUPLICATE_INDEX_ENABLED, dataset_signature, find_duplicates, record_dataset, duplicate_message
+from jobs import submit_job, get_job, cancel_job, DONE, FAILED, CANCELLED, FINISHED_STATES
+from chunked_upload import register_upload_routes, spool_path, spool_filename, delete_spool
+from tracing import span, traced, register_metrics_route
+from warmup import WARMUP_ENABLED, start_warmup
 
 
 #########################
@@ -89,64 +98,8 @@ TABS_STYLE = {
 ######################### 
 ### PARAMETERS FOR FUNCTIONS IN LAYOUT AND CALLBACKS
 
-### LANGUAGE NAMES -- Needed for translation between langdetect and accepted API output
-language_names = {
-    "af": "Afrikaans",
-    "ar": "Arabic",
-    "bg": "Bulgarian",
-    "bn": "Bengali",
-    "ca": "Catalan",
-    "cs": "Czech",
-    "cy": "Welsh",
-    "da": "Danish",
-    "de": "German",
-    "el": "Greek",
-    "en": "English",
-    "es": "Spanish",
-    "et": "Estonian",
-    "fa": "Persian",
-    "fi": "Finnish",
-    "fr": "French",
-    "gu": "Gujarati",
-    "he": "Hebrew",
-    "hi": "Hindi",
-    "hr": "Croatian",
-    "hu": "Hungarian",
-    "id": "Indonesian",
-    "it": "Italian",
-    "ja": "Japanese",
-    "kn": "Kannada",
-    "ko": "Korean",
-    "lt": "Lithuanian",
-    "lv": "Latvian",
-    "mk": "Macedonian",
-    "ml": "Malayalam",
-    "mr": "Marathi",
-    "ne": "Nepali",
-    "nl": "Dutch",
-    "no": "Norwegian",
-    "pa": "Punjabi",
-    "pl": "Polish",
-    "pt": "Portuguese",
-    "ro": "Romanian",
-    "ru": "Russian",
-    "sk": "Slovak",
-    "sl": "Slovenian",
-    "so": "Somali",
-    "sq": "Albanian",
-    "sv": "Swedish",
-    "sw": "Swahili",
-    "ta": "Tamil",
-    "te": "Telugu",
-    "th": "Thai",
-    "tl": "Tagalog",
-    "tr": "Turkish",
-    "uk": "Ukrainian",
-    "ur": "Urdu",
-    "vi": "Vietnamese",
-    "zh-cn": "Chinese (Simplified)",
-    "zh-tw": "Chinese (Traditional)"
-}
+### DESCRIPTION GENERATION -- seconds before the streamed description is stopped
+DESCRIPTION_TIMEOUT = float(os.environ.get('DESCRIPTION_TIMEOUT', 120))
 
 ### LICENSE OPTIONS
 options_license = [
@@ -168,20 +121,50 @@ options_license = [
 ### Intitialize the app
 
 app = Dash(__name__,suppress_callback_exceptions=True, external_stylesheets=[dbc.themes.BOOTSTRAP,'https://use.fontawesome.com/releases/v5.8.1/css/all.css'])
-app.server.config['MAX_CONTENT_LENGTH'] = 1000 * 1024 * 1024 # 1GB
+app.server.config['MAX_CONTENT_LENGTH'] = 1000 * 1024 * 1024 # 1GB per request, files are uploaded in smaller chunks
+register_upload_routes(app.server)
+register_metrics_route(app.server) # Prometheus histograms of the stage timings
 app.title="OpenML Dataset Uploader"
 
 
 ### Popup for the view dataset head 
 popup_modal_view_head=dbc.Modal(
     [
-        dbc.ModalHeader("Dataset Head",style={'fontWeight':'bold','textAlign':'center','color':'black','fontSize':'20px'}),
+        dbc.ModalHeader("Dataset Preview",style={'fontWeight':'bold','textAlign':'center','color':'black','fontSize':'20px'}),
+        dbc.ModalBody(
+            html.Div(
+                [ #The grid is created when the modal opens, its rows are read from the dataset store page by page
+                ],
+                id='head-grid-container'
+        )),
+        dbc.ModalFooter(
+            dbc.Button("Close", id="close-modal-dataset-head", className="ml-auto",color='secondary')
+        ),
+    ],
+    id="modal-dataset-head",
+    size="xl",
+    centered=True,
+    backdrop="static",)
+
+### Popup for the column profile
+popup_modal_profile=dbc.Modal(
+    [
+        dbc.ModalHeader("Column Profile",style={'fontWeight':'bold','textAlign':'center','color':'black','fontSize':'20px'}),
         dbc.ModalBody(
             html.Div(
-                [ #Empty dash ag grid that will get populated when dataset is uploaded
+                [ #Filled from the profile that is computed when the dataset is uploaded
                     dag.AgGrid(
-                        id='head-grid',
-                        columnDefs=[],
+                        id='profile-grid',
+                        columnDefs=[
+                            {"headerName": "Column", "field": "Column", "sortable": True, "filter": True, "pinned": "left"},
+                            {"headerName": "Type", "field": "Type", "sortable": True, "filter": True},
+                            {"headerName": "Missing", "field": "Missing", "sortable": True},
+                            {"headerName": "Distinct", "field": "Distinct", "sortable": True},
+                            {"headerName": "Min", "field": "Min"},
+                            {"headerName": "Max", "field": "Max"},
+                            {"headerName": "Most Frequent", "field": "MostFrequent"},
+                            {"headerName": "Sample", "field": "Sample"},
+                        ],
                         rowData=[],
                         columnSize='autoSize',
                         dashGridOptions={"pagination": True, "paginationPageSize": 10}
@@ -189,10 +172,10 @@ popup_modal_view_head=dbc.Modal(
                 ]
         )),
         dbc.ModalFooter(
-            dbc.Button("Close", id="close-modal-dataset-head", className="ml-auto",color='secondary')
+            dbc.Button("Close", id="close-modal-profile", className="ml-auto",color='secondary')
         ),
     ],
-    id="modal-dataset-head",
+    id="modal-profile",
     size="xl",
     centered=True,
     backdrop="static",)
@@ -204,17 +187,19 @@ tab1_content_documentation = dbc.Card(
         html.H6("Upload Your File:"),
         html.Ul([
             html.Li("Drag and drop your dataset file into the upload field or click 'Select Files' to browse your computer."),
-            html.Li("Accepted formats: JSON, Excel, Parquet, Arff, or CSV. The file size should not exceed 1GB."),
+            html.Li("Accepted formats: JSON, Excel, Parquet, Arff, or CSV. Large files are uploaded in chunks and interrupted uploads resume when the same file is selected again."),
+            html.Li("Excel workbooks with more than one sheet: the first sheet is read, another one can be chosen under the upload box."),
             html.Li("This action will automatically initiate the description generation and language detection processes."),
         ]),
         html.H6("Fill in Dataset Details:"),
         html.Ul([
             html.Li("Name: Enter a name for your dataset in the 'Name' input field. This field is mandatory!"),
-            html.Li("Description: After up to one minute, a description will be generated automatically. Verify and edit if necessary."),
+            html.Li("Description: A description is generated automatically and appears while it is written. It can be stopped at any time. Verify and edit if necessary."),
         ]),
         html.H6("View Dataset Head:"),
         html.Ul([
-            html.Li("Once the dataset is uploaded, use the 'View Dataset Head' button to preview the first few rows and confirm the correct upload."),
+            html.Li("Once the dataset is uploaded, use the 'View Dataset Head' button to browse the rows and confirm the correct upload. Click a column header to sort the dataset by that column."),
+            html.Li("The 'View Column Profile' button shows per column the number of missing and distinct values, the minimum, maximum, most frequent values and a sample."),
         ]),
         html.H6("Proceed to the Next Tab:"),
         html.Ul([
@@ -259,13 +244,14 @@ tab3_content_documentation = dbc.Card(
         ]),
         html.H6("Manual Verification and Editing:"),
         html.Ul([
-            html.Li("Review the generated features carefully."),
+            html.Li("Review the generated features carefully. Start with the features with a low confidence."),
         ]),
         html.H6("Upload the Dataset:"),
         html.Ul([
             html.Li("Once all steps are completed and verified, insert your API key in the provided field below."),
             html.Li("The 'Upload The Dataset' button will now be unlocked. Click it to upload your dataset using the OpenML API."),
-            html.Li("Wait up to 3 minutes for the upload to complete. A success message will be displayed upon completion."),
+            html.Li("The upload runs in the background. A progress bar shows the current stage and the upload can be cancelled until the data has been sent."),
+            html.Li("Datasets that have already been published from this uploader, or that are nearly the same, are not uploaded again. The message shows their OpenML URL. Tick the box above the button to upload anyway."),
         ]),
     ])
 )
@@ -322,12 +308,13 @@ def get_horizontal_tabs():
 home_layout = html.Div([
     html.H3('Please Upload Dataset',style={'fontWeight':'bold','textAlign':'center'}),
     html.P('Fill the required boxes',style={'textAlign':'center'}),
-        dcc.Upload(
+        # Drop zone for the chunked upload (assets/chunked_upload.js sends the file to /upload/chunk)
+        html.Div(
             id='upload-data',
             children=html.Div([
                 'Drag and Drop or ',html.A('Select Files', style={'fontWeight': 'bold'}),
                 html.Br(),
-                html.Span('We accept JSON, Excel, Parquet, Arff or CSV files up to 1GB in size.', style={'fontSize': 'smaller'}), 
+                html.Span('We accept JSON, Excel, Parquet, Arff or CSV files. Large files are uploaded in chunks.', style={'fontSize': 'smaller'}), 
             ], className='upload-content'),
             style={
                 'width': '100%',  # 100% to make it responsive
@@ -344,15 +331,33 @@ home_layout = html.Div([
                 'color': '#333',  # Dark text color for contrast
                 'transition': 'all 0.3s',  #  hover effects
                 'userSelect': 'none',  # Disable text selection
+                'cursor': 'pointer',
             },
             className='upload-box',  
-            multiple=False  # Allow just 1 file
         ),
+        html.Div(id='upload-progress', style={'textAlign': 'center', 'fontSize': 'smaller', 'marginBottom': '10px'}),
+    # Shown for workbooks with more than one sheet, the first sheet is read on upload
+    html.Div(
+        dbc.InputGroup([
+            dbc.InputGroupText("Sheet", style={'height': 'calc(1.5em + 0.75rem + 2px)'}),
+            dcc.Dropdown(id='excel-sheet', options=[], clearable=False,
+                         style={'height': 'calc(1.5em + 0.75rem + 2px)', 'width': '80%', 'minWidth': '15rem'}),
+        ], className="mb-3"),
+        id='excel-sheet-row', style={'display': 'none'},
+    ),
+    # Upload id and sheets of the workbook, its spool file is kept until another file is uploaded
+    dcc.Store(id='excel-workbook'),
     dbc.InputGroup([dbc.InputGroupText("Name*"), dbc.Input(id='Name',placeholder="Fill the name of your dataset",),],className="mb-3"),
-    dcc.Loading(id="loading-output", children=[
-        dbc.Textarea(id='description-textarea',placeholder="Description",className="mb-3",
-                     style={'height': 300})
-                     ], type="default"),
+    # The description is streamed into the textarea by a background job (poll_describe_job)
+    dbc.Textarea(id='description-textarea',placeholder="Description",className="mb-1",
+                 style={'height': 300}),
+    html.Div([
+        html.Span(id='description-status', style={'fontSize': 'smaller', 'marginRight': '10px'}),
+        dbc.Button("Stop Generating", id='cancel_description', color='secondary', size='sm', style={'display': 'none'}),
+    ], className="mb-3"),
+    dcc.Interval(id='describe-poll', interval=500, disabled=True),
+    dcc.Store(id='describe-job'),
+    dcc.Store(id='describe-cancel'),
 
     dbc.InputGroup(
         [
@@ -368,10 +373,14 @@ home_layout = html.Div([
         dbc.Button(
             "View Uploaded Dataset Head",id='view_head_btn',color='secondary',
             className="me-1"),
+        dbc.Button(
+            "View Column Profile",id='view_profile_btn',color='secondary',
+            className="me-1"),
         ],style={'textAlign': 'center'}  
     ),   
 
     popup_modal_view_head,
+    popup_modal_profile,
 
 ])
 
@@ -502,6 +511,7 @@ features_layout = html.Div([
                 id='feature-grid',
                 columnDefs=[{"headerName": "Feature Name","field":"FeatureName", "sortable": True, "filter": False,"headerClass": "center-header"},
                             {"headerName": "Suggested Feature Type","field":"FeatureType", "sortable": True, "filter": True, 'editable':False,"headerClass": "center-header"},
+                            {"headerName": "Confidence","field":"Confidence", "sortable": True, "filter": False, 'editable':False,"headerClass": "center-header"},
                             {
                                 'headerName': "Publish with Feature Type (EDITABLE)",
                                 "headerClass": "center-header",
@@ -575,11 +585,12 @@ app.layout = html.Div([
         dbc.InputGroup([
             dbc.Input(id='apikey', placeholder="Enter your api key", type="text"),
             dbc.Tooltip(
-                "The upload can take a few minutes. Please be patient.",
+                "The upload runs in the background, its progress is shown below the button.",
                 target="submit",  # Tooltip target
             ),
             dbc.InputGroupText("API Key"),
         ], className="mb-3",),
+        dbc.Checkbox(id='allow-duplicate', label="Upload even if the same or a similar dataset has already been published", value=False, className="mb-3"),
         
         dbc.Row([
             dbc.Col(dbc.Button("Upload The Dataset", id="submit", disabled=True, style={'backgroundColor': '#343a40', 'color': 'white', 'borderRadius': '5px'}, className="me-1"), width="auto"),
@@ -587,9 +598,18 @@ app.layout = html.Div([
         ], justify="between"),
         
         dcc.Loading(html.Div(id='output_upload')),
+        html.Div(id='publish-status'),
+        dbc.Button("Cancel Upload", id="cancel_upload", color='danger', size='sm', disabled=True, style={'display': 'none'}),
+        # Polls the background publish job, enabled while a job is running
+        dcc.Interval(id='publish-poll', interval=1000, disabled=True),
+        dcc.Store(id='publish-job'),
+        dcc.Store(id='publish-cancel'),
     ], style=CONTENT_STYLE),
 
+    # Holds only the token of the dataset in the server side store (dataset_store.py)
     dcc.Store(id='stored-dataframe'),
+    # Set by assets/chunked_upload.js when the file has been spooled on the server
+    dcc.Store(id='spool-upload'),
 
 
     documentation_modal,
@@ -615,90 +635,243 @@ def toggle_modal(n1, n2, is_open):
         return not is_open
     return False
 
+PREVIEW_BLOCK_ROWS = 100 # rows per request of the preview grid
+
 @app.callback(
-    [Output('head-grid','rowData'),Output('head-grid','columnDefs')],
+    Output('head-grid-container','children'),
     [Input('view_head_btn','n_clicks')],
     [State('stored-dataframe','data')],
     prevent_initial_call=True
 )
 def view_head(n_clicks,data):
+    # Only the column names are read here, the rows are requested by the grid while scrolling
     if data is not None:
-        df = pd.read_json(data, orient='split')
-        head = df.head()
-        columnDefs = [{"headerName": col, "field": col, "sortable": True, "filter": True} for col in head.columns]
-        rowData = head.to_dict('records')
-        return rowData,columnDefs
+        try:
+            columns, n_rows = dataset_schema(data)
+        except KeyError:
+            raise PreventUpdate
+        columnDefs = [{"headerName": col, "field": col, "sortable": True} for col in columns]
+        return dag.AgGrid(
+            id='head-grid',
+            columnDefs=columnDefs,
+            rowModelType="infinite",
+            columnSize='autoSize',
+            dashGridOptions={"pagination": True, "paginationPageSize": 10, "cacheBlockSize": PREVIEW_BLOCK_ROWS,
+                             "maxBlocksInCache": 20, "rowBuffer": 0, "infiniteInitialRowCount": min(n_rows, PREVIEW_BLOCK_ROWS)}
+        )
     raise PreventUpdate
 
+@app.callback(
+    Output('head-grid','getRowsResponse'),
+    [Input('head-grid','getRowsRequest')],
+    [State('stored-dataframe','data')],
+    prevent_initial_call=True
+)
+def preview_rows(request,data):
+    # Server side row model: read only the requested block of rows, sorted on the server
+    if request is None or data is None:
+        raise PreventUpdate
+    sort_model = request.get('sortModel') or []
+    sort_by = sort_model[0]['colId'] if sort_model else None
+    ascending = not sort_model or sort_model[0]['sort'] == 'asc'
+    try:
+        _, n_rows = dataset_schema(data)
+        rows = read_rows(data, request['startRow'], request['endRow'], sort_by=sort_by, ascending=ascending)
+    except KeyError:
+        raise PreventUpdate
+    # to_json turns timestamps, NaN and numpy types into plain JSON values
+    return {"rowData": json.loads(rows.to_json(orient='records', date_format='iso')), "rowCount": n_rows}
+
+
+####################################
+### VIEW PROFILE CALLBACK
+@app.callback(
+    Output("modal-profile", "is_open"),
+    [Input("view_profile_btn", "n_clicks"), Input("close-modal-profile", "n_clicks")],
+    [State("modal-profile", "is_open")],
+    prevent_initial_call=True,
+)
+def toggle_profile_modal(n1, n2, is_open):
+    if n1 or n2:
+        return not is_open
+    return False
+
+@app.callback(
+    Output('profile-grid','rowData'),
+    [Input('view_profile_btn','n_clicks')],
+    [State('stored-dataframe','data')],
+    prevent_initial_call=True
+)
+def view_profile(n_clicks,data):
+    # The profile is stored with the dataset, nothing is computed here
+    if data is not None:
+        try:
+            profile = load_metadata(data).get('profile') or {}
+        except KeyError:
+            raise PreventUpdate
+        rowData = [
+            {"Column": col, "Type": column_profile['dtype'],
+             "Missing": column_profile['nulls'],
+             "Distinct": column_profile['distinct'] if column_profile['exact'] else f"~{column_profile['distinct']}",
+             "Min": str(column_profile['min']) if column_profile['min'] is not None else '',
+             "Max": str(column_profile['max']) if column_profile['max'] is not None else '',
+             "MostFrequent": ", ".join(f"{value} ({count})" for value, count in column_profile['top'][:5]),
+             "Sample": ", ".join(str(value) for value in column_profile['sample'][:5])}
+            for col, column_profile in profile.items()]
+        return rowData
+    raise PreventUpdate
 
 
 ####################################
 ### LOAD UPLOADED DATASETS, OUTPUT DESCRIPTION AND LANGUAGE
 @app.callback(
-    Output('stored-dataframe', 'data'),Output('upload-data','children'),Output('language','value'),Output('description-textarea','value'),
-    Input('upload-data', 'contents'),
-    State('upload-data', 'filename'),
+    Output('stored-dataframe', 'data'),Output('upload-data','children'),Output('language','value'),Output('describe-job','data'),
+    Output('excel-sheet', 'options'),Output('excel-sheet', 'value'),Output('excel-sheet-row', 'style'),Output('excel-workbook', 'data'),
+    Input('spool-upload', 'data'),
+    Input('excel-sheet', 'value'),
+    State('excel-workbook', 'data'),
     prevent_initial_call=True,
     
 )
-def parse_contents(contents, filename):
-    if contents is not None:
-        content_type, content_string = contents.split(',')
-        decoded = base64.b64decode(content_string)
+@traced('parse_contents')
+def parse_contents(spooled, sheet, workbook):
+    if ctx.triggered_id == 'excel-sheet':
+        ### Another sheet of the workbook that was uploaded last
+        if workbook is None or sheet is None:
+            raise PreventUpdate
+        spooled = {'upload_id': workbook['upload_id']}
+    else:
+        sheet = None
+        if workbook is not None and spooled is not None and workbook['upload_id'] != spooled['upload_id']:
+            delete_spool(workbook['upload_id'])
+        workbook = None
+    if spooled is not None:
+        upload_id = spooled['upload_id']
+        hidden = {'display': 'none'}
+        try:
+            path = spool_path(upload_id)
+            filename = spool_filename(upload_id)
+        except KeyError as e:
+            return None,html.Div(f"Dataset upload has failed. {e}"),'',None,[],None,hidden,None
+        keep_spool = False
         try:
-            if 'csv' in filename:
-                ### Get the sample for the sniffer
-                sample = io.StringIO(decoded.decode('utf-8')).read(4096)
-                
-                ### Use sniffer to detect the delimeter
-                sniffer = csv.Sniffer()
-                dialect = sniffer.sniff(sample)
-                has_header = sniffer.has_header(sample)
-                
-                ### Check if there is a header
-                header = 0 if has_header else None
-                
-                df = pd.read_csv(io.BytesIO(decoded), delimiter=dialect.delimiter, header=header)
-
-                ### Rename the unnamed column to have a name index
-                if 'Unnamed: 0' in df.columns:
-                    df = df.rename(columns={'Unnamed: 0': 'Index'})
-            elif 'arff' in filename:
-                # Assume the user uploaded an ARFF file
-                decoded = arff.loads(decoded.decode('utf-8'))
-                column_names = [attribute_instance[0] for attribute_instance in decoded['attributes']]
-                df = pd.DataFrame(decoded['data'],columns=column_names)
-                if 'Unnamed: 0' in df.columns:
-                    df = df.rename(columns={'Unnamed: 0': 'Index'})
-            elif 'xls' in filename:
-                # Assume that the user uploaded an excel file
-                df = pd.read_excel(io.BytesIO(decoded))
-                if 'Unnamed: 0' in df.columns:
-                    df = df.rename(columns={'Unnamed: 0': 'Index'})
-            elif 'json' in filename:
-                # Assume that the user uploaded a JSON file
-                df = pd.read_json(io.StringIO(decoded.decode('utf-8')))
-                if 'Unnamed: 0' in df.columns:
-                    df = df.rename(columns={'Unnamed: 0': 'Index'})
-            elif 'parquet' in filename:
-                # Assume the user uploaded a Parquet file
-                df = pd.read_parquet(io.BytesIO(decoded))
-                if 'Unnamed: 0' in df.columns:
-                    df = df.rename(columns={'Unnamed: 0': 'Index'})
-            ### Need to make arfff
-            else:
-                return pd.DataFrame().to_json(date_format='iso', orient='split'),html.Div("Not accepted file type"),'',''
+            if file_kind(filename) is None:
+                return None,html.Div("Not accepted file type"),'',None,[],None,hidden,None
+            ### Excel: the sheet names come from the workbook part, only the selected sheet is read
+            if file_kind(filename) == 'xls':
+                if workbook is None:
+                    with span('excel_sheets'):
+                        workbook = {'upload_id': upload_id, 'sheets': excel_sheets(path)}
+                if not workbook['sheets']:
+                    return None,html.Div("Dataset upload has failed. The workbook has no sheets"),'',None,[],None,hidden,None
+                sheet = sheet if sheet in workbook['sheets'] else workbook['sheets'][0]
+                keep_spool = len(workbook['sheets']) > 1
+            ### CSV is sniffed and parsed with pyarrow, ARFF is streamed into typed columns with its declared types
+            with span('read', os.path.getsize(path)):
+                df, declared_types = read_dataset(path, filename, sheet=sheet)
+            ### Downcast numbers and turn repeated strings into categoricals, the compact dtypes are kept until publish
+            with span('optimize_dtypes'):
+                df, memory_report = optimize_dtypes(df)
+            ### One pass over every column, the profile is reused for the prompt, the feature types and publishing
+            with span('profile'):
+                profile = profile_dataset(df)
+            ### Keep the dataset on the server, the browser only gets the token
+            with span('store') as stage:
+                token = save_dataset(df, filename=filename, metadata={'declared_types': declared_types, 'memory_report': memory_report, 'profile': profile})
+                stage['payload_bytes'] = os.path.getsize(dataset_path(token))
         except Exception as e:
-            df=pd.DataFrame()
-            return df.to_json(date_format='iso', orient='split'),html.Div(f"Dataset upload has failed. {e}"),'',''
+            return None,html.Div(f"Dataset upload has failed. {e}"),'',None,dash.no_update,dash.no_update,dash.no_update,workbook if keep_spool else None
+        finally:
+            if not keep_spool:
+                delete_spool(upload_id)
         
-        sampled_values = {col: df[col].sample(5).tolist() for col in df.columns}
-        sampled_values_str = str(f"Dataset name: {filename}, Columns : ")+", ".join([f"{col}: {values}" for col, values in sampled_values.items()])
+        # The profile sample has a fixed seed: the same file gives the same prompt, so its description is served from the cache
+        # Wide tables give several prompts within the token budget, they are summarized by describe_job
+        prompts = build_prompts(filename, profile)
         
 
-        language_prediciton = detect(sampled_values_str)
+        with span('detect_language', len(prompts[0].encode('utf-8'))):
+            language_prediciton = detect(prompts[0])
         language = language_names[language_prediciton]
-        return df.to_json(date_format='iso', orient='split'),html.Div(f"{filename} has been uploaded successfully."),language, chat_api(sampled_values_str)
+        ### The description is generated in the background, the upload doesn't wait for it
+        describe_id = submit_job(describe_job, filename, prompts, kind='describe')
+        memory_before = sum(col['bytes_before'] for col in memory_report) / 1024 / 1024
+        memory_after = sum(col['bytes_after'] for col in memory_report) / 1024 / 1024
+        uploaded = f"{filename} ({sheet})" if keep_spool else filename
+        message = html.Div(f"{uploaded} has been uploaded successfully. Memory: {memory_before:.1f} MB -> {memory_after:.1f} MB.")
+        if keep_spool:
+            return token,message,language,describe_id,workbook['sheets'],sheet,{'display': 'block'},workbook
+        return token,message,language,describe_id,[],None,hidden,None
+    raise PreventUpdate
+
+
+@traced('describe_job')
+def describe_job(job, filename, prompts, timeout=DESCRIPTION_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    text = ''
+    last_flush = 0
+    if len(prompts) > 1:
+        # Map step, the requests of every chunk are in the trace log
+        job.report('summarizing columns', 0.0)
+        with span('chat_api_map', sum(len(prompt.encode('utf-8')) for prompt in prompts)) as stage:
+            sampled_values_str, requests = description_prompt(filename, prompts, timeout=timeout)
+            stage['prompt_tokens'] = sum(request['tokens'] for request in requests)
+            stage['requests'] = requests
+    else:
+        sampled_values_str = prompts[0]
+    job.report('generating', 0.0)
+    with span('chat_api', len(sampled_values_str.encode('utf-8'))) as stage:
+        stage['prompt_tokens'] = count_tokens(text_persona + sampled_values_str)
+        for token in stream_chat_api(sampled_values_str, timeout=timeout):
+            text += token
+            now = time.monotonic()
+            if now > deadline:
+                job.partial_result(text)
+                raise TimeoutError(f"Description generation took longer than {timeout} seconds")
+            # Write the text to the job store a few times per second, this also checks for cancellation
+            if now - last_flush > 0.25:
+                job.report('generating', 0.0)
+                job.partial_result(text)
+                last_flush = now
+    return text
+
+
+####################################
+### STREAM THE DESCRIPTION INTO THE TEXTAREA
+@app.callback(
+    Output('description-textarea','value'),Output('description-status','children'),Output('describe-poll','disabled'),Output('cancel_description','style'),
+    Input('describe-job','data'),Input('describe-poll','n_intervals'),
+    prevent_initial_call=True
+)
+def poll_describe_job(job_id, n):
+    hidden = {'display': 'none'}
+    if job_id is None:
+        return '', '', True, hidden
+    try:
+        job = get_job(job_id)
+    except KeyError:
+        return dash.no_update, "The description job could not be found", True, hidden
+
+    text = job['result'] or ''
+    if job['status'] == DONE:
+        return text, '', True, hidden
+    if job['status'] == FAILED:
+        return text, f"Description generation has failed: {job['message'].rstrip('.')}. Please write the description yourself.", True, hidden
+    if job['status'] == CANCELLED:
+        return text, "Description generation has been stopped.", True, hidden
+    return text, "Generating description...", False, {'display': 'inline-block'}
+
+
+@app.callback(
+    Output('describe-cancel', 'data'),
+    Input('cancel_description', 'n_clicks'),
+    State('describe-job', 'data'),
+    prevent_initial_call=True
+)
+def cancel_describe_job(n, job_id):
+    if n and job_id is not None:
+        cancel_job(job_id)
+        return job_id
     raise PreventUpdate
 
 
@@ -716,19 +889,27 @@ def parse_contents(contents, filename):
     [Input('features_btn', 'n_clicks')],
     [State('stored-dataframe','data')]
 )
+@traced('load_features')
 def load_features(n, stored_data):
     ctx = dash.callback_context
     if ctx.triggered_id == "features_btn":
         if stored_data !=None:
-            # Load the dataframe from JSON
-            df = pd.read_json(stored_data, orient='split')
-            feature_predictions = return_predictions_of_features(df)
+            # Load the dataframe from the server side store
+            try:
+                with span('load_dataset', os.path.getsize(dataset_path(stored_data))):
+                    df = load_dataset(stored_data)
+                    metadata = load_metadata(stored_data)
+            except KeyError:
+                return []
+            with span('feature_types'):
+                feature_predictions = return_predictions_of_features(df, known_types=metadata.get('declared_types'), profile=metadata.get('profile'))
             #feature_types = feature_predictions[2]
             feature_proposal = feature_predictions[0]
+            confidence = feature_predictions[3]
 
             # Shown data in the table
             rowData = [
-                {"FeatureName": df.columns[col], "FeatureType":str(feature_proposal[col]),"FeatureTypePublish":str(feature_proposal[col])} 
+                {"FeatureName": df.columns[col], "FeatureType":str(feature_proposal[col]),"Confidence":round(confidence[col], 2),"FeatureTypePublish":str(feature_proposal[col])} 
                 for col in range(len(df.columns))]
             return rowData
     return []
@@ -739,21 +920,22 @@ def load_features(n, stored_data):
 
 ### PUBLISH DATASET
 @app.callback(
-    Output('output_upload','children'),
+    Output('output_upload','children'),Output('publish-job','data'),
     Input('submit','n_clicks'),
     [State('stored-dataframe', 'data'),State('language','value'),State('Name', 'value'),State('description-textarea','value'),
      State('license','value'),State('creator','value'),State('contributor','value'),State('citation','value'),
      State('collection_date','date'),State('feature-grid','rowData'),State('default_target_attribute','value'),State('ignore_attribute','value'),
-     State('index_column','value'),State('apikey','value')],
+     State('index_column','value'),State('apikey','value'),State('allow-duplicate','value')],
     prevent_initial_call = True
 
 )
-def publish_dataset(n,data,lang,name,desc,license,creator,contributor,citation,date,features,target,ign,indx,api):
+@traced('publish_dataset')
+def publish_dataset(n,data,lang,name,desc,license,creator,contributor,citation,date,features,target,ign,indx,api,allow_duplicate):
     ctx = dash.callback_context
     if ctx.triggered_id == "submit":
 
         if api is None or api == '':
-            return "Please enter your API key"
+            return "Please enter your API key", None
         date = datetime.strptime(date, '%Y-%m-%d')
         date = date.strftime('%d-%m-%Y')
 
@@ -777,49 +959,24 @@ def publish_dataset(n,data,lang,name,desc,license,creator,contributor,citation,d
         citation = str(citation)
 
         if features is None:
-            return "No features have been detected / check dataset upload"
+            return "No features have been detected / check dataset upload", None
         if data is None:
-            return "Upload was unsuccesfull , check if format of file matches"
+            return "Upload was unsuccesfull , check if format of file matches", None
         try:
-            df = pd.read_json(data, orient='split')
+            with span('load_dataset', os.path.getsize(dataset_path(data))):
+                df = load_dataset(data)
+                profile = load_metadata(data).get('profile')
+        except KeyError:
+            return "The uploaded dataset has expired on the server, please upload it again", None
         except:
-            return "There was a problem with reading the dataset, check if dataset is alright"
+            return "There was a problem with reading the dataset, check if dataset is alright", None
 
-        choice_to_arff = []
         #### TRANSLATE CHOICES MADE BY USER TO APPROPRIATE ARFF TYPES
-        for i in features:
-            if i['FeatureTypePublish'] == 'not-generalizable':
-                choice_to_arff.append(('STRING'))
-            elif i['FeatureTypePublish'] == 'context-specific':
-                choice_to_arff.append(('STRING'))
-            elif i['FeatureTypePublish'] == 'embedded-number':
-                choice_to_arff.append(('STRING'))
-            elif i['FeatureTypePublish'] == 'list':
-                choice_to_arff.append(('STRING'))
-            elif i['FeatureTypePublish'] == 'url':
-                choice_to_arff.append(('STRING'))
-            elif i['FeatureTypePublish'] == 'sentence':
-                choice_to_arff.append(('STRING'))
-            elif i['FeatureTypePublish'] == 'datetime':
-                choice_to_arff.append(('STRING'))
-            elif i['FeatureTypePublish'] == 'boolean':
-                choice_to_arff.append([str(value) for value in df[i['FeatureName']].unique()])
-            elif i['FeatureTypePublish'] == 'categorical':
-                choice_to_arff.append([str(value) for value in df[i['FeatureName']].unique()])
-            elif i['FeatureTypePublish'] == 'floating':
-                choice_to_arff.append(('REAL'))
-            elif i['FeatureTypePublish'] == 'integer':
-                choice_to_arff.append(('INTEGER'))
-            else:
-                choice_to_arff.append(('STRING'))
-
-        features = [(features[row_id]['FeatureName'], choice_to_arff[row_id]) for row_id in range(len(features))]
-
-
         try:
-            features  = [tuple(item) for item in features]
-        except:
-            return "No features have been detected / check dataset upload"
+            with span('build_attributes'):
+                features, downgraded = build_attributes(df, features, profile=profile)
+        except KeyError:
+            return "No features have been detected / check dataset upload", None
         
         ## Check if any of the inputs is None
         if target =='None' or target == '':
@@ -829,16 +986,93 @@ def publish_dataset(n,data,lang,name,desc,license,creator,contributor,citation,d
         if indx =='None' or indx == '':
             indx = None
 
-        ### Try to upload the dataset with predicted features
-        try:
-            return publish(data=df,name=name,description=desc,license=license,creator=creator,contributor=contributor,collection_date=date,language=lang,attributes=features,default_target_attribute=target,ignore_attribute=ign,citation=citation,api=api,row_id=indx) + "     ||| Method:  Features have been choosen correctly" 
-        except Exception as e:
-            ### Try to upload the dataset with auto detection of features
-            try: 
-                return publish(data=df,name=name,description=desc,license=license,creator=creator,contributor=contributor,collection_date=date,language=lang,attributes='auto',default_target_attribute=target,ignore_attribute=ign,citation=citation,api=api,row_id=indx) + "     ||| Method: Features have been choosen automatically"
-            except Exception as a:
-                ### Show the errors that occured
-                return f"Error: {a} and {e}"
+        ### Everything OpenML would reject is checked here, before anything is sent
+        with span('validate'):
+            errors = validate_publish(df, features, target, ign, indx, profile=profile)
+        if errors:
+            return "The dataset can't be published: " + error_message(errors), None
+
+        ### Datasets that have been published from here before are not uploaded again
+        signature = None
+        if DUPLICATE_INDEX_ENABLED:
+            with span('duplicate_check'):
+                signature = dataset_signature(df, profile)
+                duplicates = find_duplicates(signature)
+            if duplicates and not allow_duplicate:
+                return "This dataset has already been published: " + duplicate_message(duplicates) + \
+                    ". Tick the box above the button to upload it anyway.", None
+
+        ### Publish in a background job, the progress is polled by poll_publish_job
+        metadata = dict(name=name,description=desc,license=license,creator=creator,contributor=contributor,collection_date=date,language=lang,
+                        default_target_attribute=target,ignore_attribute=ign,citation=citation,api=api,row_id=indx)
+        job_id = submit_job(publish_job, data, features, metadata, signature, kind='publish')
+        message = "The upload has started. You can follow its progress below."
+        if downgraded:
+            message += " " + ", ".join(f"{col} ({count} values)" for col, count in downgraded) + \
+                f" have more than {MAX_NOMINAL_VALUES} distinct values and are uploaded as STRING instead of categorical."
+        return message, job_id
+
+
+@traced('publish_job')
+def publish_job(job, token, features, metadata, signature=None):
+    # Stages reported by publish: serialize, upload, server ack. The serialization can be cancelled
+    # between chunks, once the upload has started the job can't be cancelled anymore.
+    progress = lambda stage, fraction: job.report(stage, fraction, cancellable=stage == 'serialize')
+
+    ### The attributes have been validated (validate_publish), the dataset is streamed from the store one row group at a time
+    message = publish(data=iter_row_groups(token),attributes=features,progress=progress,check_cancel=job.check_cancel,**metadata)
+    ### Remember the published dataset for the duplicate check
+    if signature is not None and published_url(message):
+        record_dataset(signature, published_url(message), metadata['name'])
+    return message
+
+
+####################################
+### PUBLISH PROGRESS
+@app.callback(
+    Output('publish-status','children'),Output('publish-poll','disabled'),Output('cancel_upload','disabled'),Output('cancel_upload','style'),
+    Input('publish-job','data'),Input('publish-poll','n_intervals'),
+    prevent_initial_call=True
+)
+def poll_publish_job(job_id, n):
+    hidden = {'display': 'none'}
+    if job_id is None:
+        return '', True, True, hidden
+    try:
+        job = get_job(job_id)
+    except KeyError:
+        return "The upload job could not be found", True, True, hidden
+
+    finished = job['status'] in FINISHED_STATES
+    cancellable = job['cancellable'] is None or bool(job['cancellable'])
+    if job['status'] == DONE:
+        late_cancel = " The cancel came after the upload had started, the dataset has been published." if job['cancel_requested'] else ""
+        status = html.Div(job['result'] + late_cancel)
+    elif job['status'] == FAILED:
+        status = html.Div(f"The upload has failed. {job['message']}")
+    elif job['status'] == CANCELLED:
+        status = html.Div("The upload has been cancelled.")
+    else:
+        if not cancellable:
+            label = f"{job['stage']} (can't be cancelled anymore)"
+        else:
+            label = 'cancelling...' if job['cancel_requested'] else job['stage']
+        status = dbc.Progress(value=int(100 * (job['progress'] or 0)), label=label, striped=True, animated=True, className="mb-2")
+    cancel_disabled = finished or bool(job['cancel_requested']) or not cancellable
+    return status, finished, cancel_disabled, hidden if finished else {'display': 'inline-block'}
+
+
+@app.callback(
+    Output('publish-cancel', 'data'),
+    Input('cancel_upload', 'n_clicks'),
+    State('publish-job', 'data'),
+    prevent_initial_call=True
+)
+def cancel_publish_job(n, job_id):
+    if n and job_id is not None:
+        cancel_job(job_id)
+        return job_id
+    raise PreventUpdate
 
 
 ####################################
@@ -871,4 +1105,8 @@ def toggle_modal(n1, n2, is_open):
 ### START APP
 ##############################
 if __name__ == '__main__':
+    # sortinghat, langdetect, openml and openai are loaded while the server starts.
+    # The debug reloader runs this file in a watcher process too, only the serving process warms up.
+    if WARMUP_ENABLED and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warmup()
     app.run_server(debug=True)
@@ -0,0 +1,20 @@
+import gc
+from whole_app import app
+from warmup import WARMUP_ENABLED, warm_up
+
+
+###################################
+## WSGI entry point for production servers
+#   gunicorn --preload --workers 4 --threads 4 --bind 0.0.0.0:8050 wsgi:server
+# or the launcher: python serve.py --workers 4
+# With --preload this module is imported once in the master process. The sortinghat model and
+# the language profiles are loaded before the workers are forked and shared copy-on-write.
+# Jobs, datasets and caches live in SQLite and on disk, so every worker sees all of them.
+
+server = app.server
+
+if WARMUP_ENABLED:
+    warm_up()
+# The objects loaded so far are never touched by the garbage collector of the workers,
+# otherwise collecting them would write to (and copy) the shared pages
+gc.freeze()